@@ -0,0 +1,144 @@
+"""
+Кэши для пути входа: LRU-кэш с ограничением времени жизни и таблица сессий.
+
+LRUCache хранит не больше 'maxsize' записей; при переполнении вытесняется
+запись, к которой дольше всего не обращались, а записи старше 'ttl' секунд
+считаются отсутствующими. Счетчики попаданий и промахов доступны через stats().
+
+SessionTable выдает случайные токены сессий для вошедших пользователей,
+чтобы повторные запросы не требовали пароля.
+"""
+import secrets
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    LRU-кэш с TTL.
+
+    :param maxsize: Максимальное число записей.
+    :param ttl: Время жизни записи в секундах (None - без ограничения).
+    :param clock: Функция текущего времени (для тестов можно подменить).
+    :param on_remove: Функция f(ключ, значение), вызываемая, когда запись покидает кэш
+                      (вытеснение, истечение срока, invalidate).
+    """
+
+    def __init__(self, maxsize=10000, ttl=300.0, clock=time.monotonic, on_remove=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.on_remove = on_remove
+        self._data = OrderedDict() # ключ -> (время добавления, значение); порядок - от старых обращений к новым
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None, valid=None):
+        """
+        Возвращает значение по ключу или 'default', если его нет или оно устарело.
+        Если передана функция 'valid' и она вернула False для значения, возвращается
+        'default' и обращение считается промахом (запись при этом остается в кэше).
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        created, value = entry
+        if self.ttl is not None and self.clock() - created > self.ttl:
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            self._removed(key, value)
+            return default
+        if valid is not None and not valid(value):
+            self.misses += 1
+            return default
+        self._data.move_to_end(key) # Отмечаем как недавно использованную
+        self.hits += 1
+        return value
+
+    def _removed(self, key, value):
+        if self.on_remove is not None:
+            self.on_remove(key, value)
+
+    def put(self, key, value):
+        """Добавляет или обновляет запись, при переполнении вытесняя самую старую."""
+        self._data[key] = (self.clock(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            old_key, (_, old_value) = self._data.popitem(last=False)
+            self.evictions += 1
+            self._removed(old_key, old_value)
+
+    def invalidate(self, key):
+        """Удаляет запись по ключу, если она есть."""
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._removed(key, entry[1])
+
+    def __contains__(self, key):
+        """Есть ли ключ в кэше (без учета в счетчиках и без проверки срока жизни)."""
+        return key in self._data
+
+    def clear(self):
+        """Удаляет все записи (счетчики сохраняются)."""
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Счетчики кэша в виде словаря."""
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "expirations": self.expirations}
+
+
+class SessionTable:
+    """
+    Таблица сессий: токен -> логин, с ограничением времени жизни.
+
+    :param ttl: Время жизни сессии в секундах.
+    :param maxsize: Максимальное число одновременных сессий.
+    """
+
+    def __init__(self, ttl=3600.0, maxsize=100000, clock=time.monotonic):
+        # Уходящие из кэша сессии (закрытие, истечение, вытеснение) сразу убираются из обратного индекса
+        self._sessions = LRUCache(maxsize, ttl, clock, on_remove=self._forget)
+        self._tokens_by_login = {} # логин -> множество его токенов (для завершения всех сессий)
+
+    def _forget(self, token, login):
+        """Убирает токен из обратного индекса; логин без сессий удаляется из него целиком."""
+        tokens = self._tokens_by_login.get(login)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_login[login]
+
+    def create(self, login):
+        """Создает сессию для пользователя и возвращает ее токен."""
+        token = secrets.token_urlsafe(16)
+        self._tokens_by_login.setdefault(login, set()).add(token)
+        self._sessions.put(token, login)
+        return token
+
+    def get_login(self, token):
+        """Возвращает логин по токену или None, если сессии нет или она истекла."""
+        return self._sessions.get(token)
+
+    def close(self, token):
+        """Завершает сессию."""
+        self._sessions.invalidate(token)
+
+    def close_login(self, login):
+        """Завершает все сессии пользователя (например, при изменении его записи)."""
+        for token in list(self._tokens_by_login.get(login, ())):
+            self._sessions.invalidate(token) # Токен убирается из индекса в _forget
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        """Счетчики таблицы сессий в виде словаря."""
+        return self._sessions.stats()
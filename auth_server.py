@@ -0,0 +1,301 @@
+"""
+Сетевой сервер регистрации и входа на asyncio и генератор нагрузки к нему.
+
+Протокол строковый: клиент отправляет по одному JSON-объекту в строке,
+сервер отвечает тоже одной JSON-строкой.
+    {"op": "login", "login": "...", "password": "..."}
+    {"op": "register", "last_name": "...", ..., "password": "...", "password_confirm": "..."}
+    {"op": "profile", "login": "..."}
+    {"op": "session", "token": "..."}   - данные пользователя по токену из ответа login
+    {"op": "logout", "token": "..."}
+    {"op": "stats"}                     - счетчики кэша учетных данных и сессий
+    {"op": "search", "city": "...", "name_prefix": "...", "offset": 0, "limit": 50}
+                                        - поиск пользователей (см. user_query.py)
+Ответ: {"ok": true, ...} или {"ok": false, "error": "ТипОшибки", "message": "текст"}.
+Запрос, который не является объектом JSON или содержит поля неверного типа,
+получает ответ с ошибкой "BadRequest"; соединение при этом не закрывается.
+Так же отвечает и на строку длиннее MAX_LINE байт.
+
+Все регистрации проходят через одну задачу-писателя (очередь asyncio.Queue),
+поэтому проверка дубликатов и дозапись в users.data всегда выполняются строго
+по очереди. Остальные запросы выполняются в пуле потоков: подгрузка чужих
+записей берет блокировку файла, и цикл событий не должен ее ждать.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from auth_service import AuthService, AuthError
+from metrics import percentile
+from user_data import FILENAME
+
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_LINE = 64 * 1024 # Наибольшая длина строки запроса, байт
+
+# Поля запроса регистрации в порядке аргументов AuthService.register
+REGISTER_FIELDS = ("last_name", "first_name", "middle_name", "birth_date", "gender", "city", "email",
+                   "login", "password", "password_confirm")
+# Условия поиска, которые принимает операция search
+SEARCH_FIELDS = ("city", "gender", "name_prefix", "born_from", "born_to")
+# Строковые поля запросов и целочисленные параметры постраничного поиска
+STRING_FIELDS = ("op", "token") + REGISTER_FIELDS + SEARCH_FIELDS
+INTEGER_FIELDS = ("offset", "limit")
+
+
+class BadRequestError(Exception):
+    """Запрос не является объектом JSON нужного вида."""
+
+
+def check_request(request):
+    """Проверяет типы полей запроса; при ошибке бросает BadRequestError."""
+    if not isinstance(request, dict):
+        raise BadRequestError("Запрос должен быть объектом JSON.")
+    for name in STRING_FIELDS:
+        if name in request and not isinstance(request[name], str):
+            raise BadRequestError(f"Поле '{name}' должно быть строкой.")
+    for name in INTEGER_FIELDS:
+        # bool - подкласс int, но числом страницы не считается
+        if name in request and (not isinstance(request[name], int) or isinstance(request[name], bool)):
+            raise BadRequestError(f"Поле '{name}' должно быть целым числом.")
+
+
+class AuthServer:
+    """Asyncio-сервер поверх AuthService."""
+
+    def __init__(self, service):
+        self.service = service
+        self._write_queue = None # Очередь регистраций для задачи-писателя
+        self._writer_task = None
+        self._server = None
+
+    async def start(self, host=HOST, port=PORT):
+        """Запускает задачу-писателя и начинает принимать соединения."""
+        self._write_queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._writer())
+        self._server = await asyncio.start_server(self._handle_client, host, port, limit=MAX_LINE)
+        return self._server
+
+    async def stop(self):
+        """Останавливает прием соединений и дожидается записи всех регистраций."""
+        self._server.close()
+        await self._server.wait_closed()
+        await self._write_queue.join()
+        self._writer_task.cancel()
+
+    async def _writer(self):
+        """
+        Единственная задача, изменяющая хранилище и файл.
+        Запись с fsync выполняется в отдельном потоке, чтобы не блокировать вход,
+        но следующая регистрация начинается только после завершения предыдущей.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            arguments, future = await self._write_queue.get()
+            try:
+                user_account = await loop.run_in_executor(None, lambda: self.service.register(*arguments))
+                future.set_result(user_account)
+            except Exception as error:
+                future.set_exception(error)
+            finally:
+                self._write_queue.task_done()
+
+    async def _register(self, request):
+        """Ставит регистрацию в очередь писателя и ждет ее результата."""
+        future = asyncio.get_running_loop().create_future()
+        await self._write_queue.put((tuple(request.get(name, "") for name in REGISTER_FIELDS), future))
+        return await future
+
+    def _execute(self, operation, request):
+        """
+        Выполняет запрос, кроме регистрации, в потоке пула: поиск может ждать блокировку
+        файла, которую держит писатель, и цикл событий в это время не должен стоять.
+        """
+        if operation == "login":
+            token = self.service.create_session(request.get("login", ""), request.get("password", ""))
+            user_account = self.service.get_session_user(token)
+            return {"ok": True, "login": user_account["login"], "first_name": user_account["first_name"],
+                    "last_name": user_account["last_name"], "token": token}
+        if operation == "session":
+            user_account = self.service.get_session_user(request.get("token", ""))
+            return {"ok": True, "profile": self.service.get_profile(user_account["login"])}
+        if operation == "logout":
+            self.service.close_session(request.get("token", ""))
+            return {"ok": True}
+        if operation == "stats":
+            return {"ok": True, "stats": self.service.cache_stats()}
+        if operation == "search":
+            criteria = {name: request[name] for name in SEARCH_FIELDS if request.get(name)}
+            profiles, total = self.service.search_users(request.get("offset", 0), request.get("limit"), **criteria)
+            return {"ok": True, "users": profiles, "total": total}
+        if operation == "profile":
+            return {"ok": True, "profile": self.service.get_profile(request.get("login", ""))}
+        return {"ok": False, "error": "BadRequest", "message": f"Неизвестная операция '{operation}'."}
+
+    async def dispatch(self, request):
+        """Выполняет один запрос и возвращает словарь ответа."""
+        try:
+            check_request(request)
+        except BadRequestError as error:
+            return {"ok": False, "error": "BadRequest", "message": str(error)}
+        operation = request.get("op")
+        try:
+            if operation == "register":
+                user_account = await self._register(request)
+                return {"ok": True, "login": user_account["login"]}
+            return await asyncio.get_running_loop().run_in_executor(None, self._execute, operation, request)
+        except AuthError as error:
+            return {"ok": False, "error": type(error).__name__, "message": str(error)}
+
+    async def _read_line(self, reader):
+        """
+        Читает одну строку запроса. Возвращает байты строки (b"" - соединение закрыто)
+        или None, если строка длиннее MAX_LINE: ее остаток пропускается до перевода строки.
+        """
+        try:
+            return await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as error:
+            return error.partial # Последняя строка без перевода строки или конец соединения
+        except asyncio.LimitOverrunError as error:
+            await reader.readexactly(error.consumed)
+        # Пропускаем слишком длинную строку по частям, не накапливая ее в памяти
+        while True:
+            try:
+                await reader.readuntil(b"\n")
+                return None
+            except asyncio.IncompleteReadError:
+                return b""
+            except asyncio.LimitOverrunError as error:
+                await reader.readexactly(error.consumed)
+
+    async def _handle_client(self, reader, writer):
+        """Обслуживает одно соединение: читает запросы построчно до закрытия."""
+        try:
+            while True:
+                line = await self._read_line(reader)
+                if line is None:
+                    response = {"ok": False, "error": "BadRequest",
+                                "message": f"Запрос длиннее {MAX_LINE} байт."}
+                elif not line:
+                    break
+                else:
+                    try:
+                        request = json.loads(line)
+                    except ValueError:
+                        response = {"ok": False, "error": "BadRequest", "message": "Некорректный JSON."}
+                    else:
+                        response = await self.dispatch(request)
+                writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(filename=FILENAME, host=HOST, port=PORT):
+    """Загружает пользователей и обслуживает клиентов до прерывания."""
+    service = AuthService(filename)
+    count = service.load()
+    server = AuthServer(service)
+    await server.start(host, port)
+    print(f"Загружено {count} пользователей из файла '{filename}'. Сервер слушает {host}:{port}.")
+    try:
+        await asyncio.Event().wait() # Работаем до Ctrl+C
+    finally:
+        await server.stop()
+
+
+# --- Генератор нагрузки ---
+
+async def _client(host, port, requests, latencies):
+    """Одно соединение: последовательно отправляет запросы и замеряет задержку каждого."""
+    reader, writer = await asyncio.open_connection(host, port)
+    errors = 0
+    try:
+        for request in requests:
+            started = time.perf_counter()
+            writer.write(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - started)
+            if not response.get("ok"):
+                errors += 1
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return errors
+
+
+async def _run_phase(host, port, requests_per_client):
+    """Запускает клиентов параллельно и возвращает статистику фазы."""
+    latencies = []
+    started = time.perf_counter()
+    errors = await asyncio.gather(*(_client(host, port, requests, latencies) for requests in requests_per_client))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors),
+        "requests_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def run_load(host=HOST, port=PORT, clients=20, users=200, logins=2000):
+    """
+    Нагрузка на запущенный сервер: сначала 'users' регистраций,
+    затем 'logins' входов, распределенных между 'clients' соединениями.
+    """
+    prefix = f"load{int(time.time() * 1000)}_" # Уникальные логины для каждого запуска
+    accounts = [(f"{prefix}{i}", f"pw{i}") for i in range(users)]
+    registrations = [{"op": "register", "last_name": "Нагрузка", "first_name": "Тест", "middle_name": "",
+                      "birth_date": "01.01.2000", "gender": "Мужской", "city": "Москва",
+                      "email": f"{login}@load.test", "login": login,
+                      "password": password, "password_confirm": password} for login, password in accounts]
+    login_requests = [{"op": "login", "login": accounts[i % users][0], "password": accounts[i % users][1]}
+                      for i in range(logins)]
+
+    def split(requests):
+        return [requests[i::clients] for i in range(clients)]
+
+    return {
+        "register": await _run_phase(host, port, split(registrations)),
+        "login": await _run_phase(host, port, split(login_requests)),
+    }
+
+
+def main(argv=None):
+    """
+    Запуск сервера и генератора нагрузки:
+        python auth_server.py serve --port 8765
+        python auth_server.py load --clients 20 --users 200 --logins 2000
+    """
+    parser = argparse.ArgumentParser(description="Сетевой сервер регистрации и входа.")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help="Запустить сервер")
+    serve_parser.add_argument('--file', default=FILENAME, help="Файл пользователей")
+    load_parser = commands.add_parser('load', help="Нагрузить запущенный сервер")
+    load_parser.add_argument('--clients', type=int, default=20, help="Количество соединений")
+    load_parser.add_argument('--users', type=int, default=200, help="Количество регистраций")
+    load_parser.add_argument('--logins', type=int, default=2000, help="Количество входов")
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        try:
+            asyncio.run(serve(args.file, args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        result = asyncio.run(run_load(args.host, args.port, args.clients, args.users, args.logins))
+        for phase, stats in result.items():
+            print(f"{phase:9s} {stats['requests']} запросов, ошибок: {stats['errors']}, "
+                  f"{stats['requests_per_sec']:.0f} запр/с, p50 {stats['p50_ms']:.2f} мс, p99 {stats['p99_ms']:.2f} мс")
+
+
+if __name__ == "__main__":
+    main()
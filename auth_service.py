@@ -0,0 +1,515 @@
+"""
+Сервис регистрации и входа без графического интерфейса.
+
+AuthService содержит всю логику, которая раньше находилась в обработчиках
+handle_login и handle_register: проверку полей, поиск пользователя,
+XOR-кодирование пароля и запись в файл. Ошибки сообщаются исключениями
+AuthError (их текст совпадает с сообщениями в окнах GUI), поэтому сервис
+можно использовать из GUI, сервера, пакетных заданий и замеров скорости.
+Модуль не импортирует tkinter.
+
+Несколько процессов могут работать с одним файлом одновременно: запись
+выполняется под межпроцессной блокировкой, а перед ней сервис подгружает
+записи, добавленные другими процессами (только новые байты в конце файла).
+
+Файл может быть разбит на сегменты по хешу логина (user_shards.py): тогда
+сегменты загружаются параллельно, регистрация дописывает запись только в
+сегмент своего логина, а периодическое уплотнение переписывает только
+сегменты, дописанные с прошлого уплотнения. Блокировка при этом общая -
+уникальность email проверяется по всем сегментам.
+
+С файлом сервис работает через бэкенд хранилища (user_backends): по умолчанию
+это CsvBackend, а если имя файла оканчивается на .db/.sqlite/.sqlite3 -
+база SQLite (user_sqlite.SqliteBackend): при запуске ничего не загружается,
+вход и проверка дубликатов выполняются запросами по индексам.
+
+Повторный вход того же пользователя не декодирует пароль заново: проверенные
+учетные данные хранятся в LRU-кэше с ограниченным временем жизни, а после
+входа можно получить токен сессии (create_session).
+"""
+import argparse
+import hashlib
+import os
+import secrets
+import threading
+import time
+
+from auth_cache import LRUCache, SessionTable
+from metrics import set_gauge, timed
+from user_backends import open_backend
+from user_data import FILENAME, XOR_KEY, xor_cipher
+from user_record import FIELDS, User
+from user_shards import read_manifest, shard_files
+from user_store import UserStore
+
+COMPACT_EVERY = 1000 # Через сколько дозаписей в журнал выполнять уплотнение файла.
+CREDENTIAL_CACHE_SIZE = 10000 # Сколько проверенных учетных данных держать в кэше.
+CREDENTIAL_TTL = 300.0        # Время жизни записи кэша учетных данных, секунд.
+SESSION_TTL = 3600.0          # Время жизни сессии, секунд.
+
+# Поля, обязательные при регистрации (все, кроме отчества)
+REQUIRED_FIELDS = ("last_name", "first_name", "birth_date", "gender", "city", "email", "login")
+
+
+class AuthError(Exception):
+    """Базовая ошибка сервиса аутентификации. Текст ошибки можно показать пользователю."""
+
+
+class ValidationError(AuthError):
+    """Данные формы заполнены некорректно."""
+
+
+class LoginTakenError(AuthError):
+    """Пользователь с таким логином уже существует."""
+
+
+class EmailTakenError(AuthError):
+    """Пользователь с таким email уже существует."""
+
+
+class UserNotFoundError(AuthError):
+    """Пользователь с таким логином не найден."""
+
+
+class WrongPasswordError(AuthError):
+    """Пароль не совпадает с сохраненным."""
+
+
+class SessionError(AuthError):
+    """Сессия не найдена или истекла."""
+
+
+def validate_registration(fields, password, password_confirm):
+    """
+    Проверяет данные регистрации по тем же правилам, что и форма GUI.
+    'fields' - словарь с полями пользователя (без пароля).
+    При ошибке бросает ValidationError.
+    """
+    if not all(fields.get(name) for name in REQUIRED_FIELDS) or not password or not password_confirm:
+        raise ValidationError("Пожалуйста, заполните все обязательные поля (кроме Отчества).")
+    if password != password_confirm:
+        raise ValidationError("Пароли не совпадают.")
+
+
+class AuthService:
+    """
+    Регистрация, вход и просмотр профиля поверх UserStore и файла users.data.
+
+    :param filename: Файл пользователей (CSV users.data или база SQLite users.db).
+    :param store: Хранилище пользователей. Если не передано, создается новое.
+    :param key: Ключ для XOR-кодирования паролей.
+    :param compact_every: Через сколько дозаписей в журнал выполнять уплотнение файла.
+    :param credential_ttl: Время жизни записи кэша учетных данных, секунд.
+    :param session_ttl: Время жизни сессии, секунд.
+    :param backend: Хранилище на диске (user_backends.StorageBackend). Если не передано,
+                    выбирается по имени файла (open_backend).
+    """
+
+    def __init__(self, filename=FILENAME, store=None, key=XOR_KEY, compact_every=COMPACT_EVERY,
+                 credential_ttl=CREDENTIAL_TTL, session_ttl=SESSION_TTL, backend=None):
+        self.filename = filename
+        self.store = store if store is not None else UserStore()
+        self.key = key
+        self.compact_every = compact_every
+        self.appends_since_compact = 0 # Счетчик дозаписей с момента последнего уплотнения
+        # Кэш проверенных учетных данных: логин -> (закодированный пароль, хеш введенного пароля).
+        # Сам пароль в памяти не хранится - только его хеш с солью этого экземпляра сервиса.
+        self.credentials = LRUCache(CREDENTIAL_CACHE_SIZE, credential_ttl)
+        self._salt = secrets.token_bytes(16)
+        self.sessions = SessionTable(session_ttl)
+        self._query_index = None # Индекс поиска (user_query.UserQueryIndex), строится при первом поиске
+        self.backend = backend if backend is not None else open_backend(filename)
+        # Сервисом пользуются несколько потоков (сервер: цикл событий и пул потоков; GUI: фоновая загрузка).
+        # _lock защищает состояние в памяти (хранилище, кэши, сессии, индекс поиска) и держится только
+        # на время работы с ним, а не во время чтения и записи файла. _refresh_lock выстраивает в очередь
+        # чтение изменений из бэкенда. Порядок блокировок: файл (транзакция) -> _refresh_lock -> _lock.
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+
+    @timed("auth_load")
+    def load(self):
+        """Загружает пользователей из хранилища. Возвращает их количество."""
+        if self.backend.lazy:
+            # Пользователей не загружаем: хранилище ищет в бэкенде тех, кого нет в памяти
+            with self._refresh_lock:
+                users = self.backend.load() if self._query_index is not None else None
+                with self._lock:
+                    self.store.base = self.backend
+                    if users is not None:
+                        self._query_index.on_reload(users) # Индекс поиска строится из самой базы
+                    self.credentials.clear()
+            count = len(self.backend)
+        else:
+            with self.backend.transaction(exclusive=False), self._refresh_lock:
+                users = self.backend.load() # Файл разбирается без _lock - вход в это время не ждет
+                with self._lock:
+                    self._reload(users)
+                    self.credentials.clear() # Записи пользователей заменены - кэш больше не действителен
+                    count = self.store.total() # Вместе с записями двоичного снимка
+        set_gauge("users_loaded", count)
+        return count
+
+    def _reload(self, users):
+        """Заменяет пользователей хранилища записями, прочитанными из бэкенда (под _lock)."""
+        if not self.backend.lazy:
+            # Двоичный снимок рядом с файлом (users_binary.py) подключает бэкенд - в том числе
+            # новый после to-binary; его записи ищутся в нем, а не загружаются в память
+            self.store.base = self.backend.snapshot
+        self.store.reload(users)
+
+    def _refresh_locked(self):
+        """
+        Подгружает изменения хранилища, сделанные другими процессами.
+        Вызывается под блокировкой файла (транзакцией). Возвращает число добавленных
+        пользователей (после полного перечитывания - число перечитанных).
+        """
+        with self._refresh_lock:
+            users, replaced = self.backend.changes()
+            with self._lock:
+                if replaced:
+                    # Файл заменен (уплотнение или смена разбиения в другом процессе) - бэкенд перечитал
+                    # его целиком. Разность размеров хранилища здесь не годится: журнал мог уменьшиться
+                    # при переносе в снимок
+                    self._reload(users)
+                    self.credentials.clear()
+                    return len(users)
+
+                added = 0
+                for user_data in users:
+                    if self.backend.lazy:
+                        # Запись уже видна через store.base - дополняем только индекс поиска
+                        if self._query_index is not None:
+                            self._query_index.on_append(user_data)
+                    elif user_data["login"] not in self.store:
+                        self.store.append(user_data)
+                    else:
+                        continue
+                    self.invalidate_user(user_data["login"])
+                    added += 1
+                return added
+
+    def refresh(self):
+        """
+        Подгружает записи, добавленные другими процессами. Возвращает их количество.
+        Может ждать блокировку файла, которую держит запись, - не вызывать из цикла событий.
+        """
+        with self.backend.transaction(exclusive=False):
+            return self._refresh_locked()
+
+    @timed("find_user_by_login") # Поиск на пути входа (индекс UserStore или база)
+    def _find(self, login):
+        """Ищет пользователя; если не найден, проверяет, не появился ли он в файле."""
+        with self._lock:
+            user_account = self.store.find_by_login(login)
+        if user_account is None and self.refresh():
+            with self._lock:
+                user_account = self.store.find_by_login(login)
+        return user_account
+
+    @timed("auth_register")
+    def register(self, last_name, first_name, middle_name, birth_date, gender, city, email,
+                 login, password, password_confirm):
+        """
+        Регистрирует нового пользователя и дописывает его в файл.
+        Возвращает созданную запись User.
+        """
+        fields = {
+            "last_name": last_name, "first_name": first_name, "middle_name": middle_name,
+            "birth_date": birth_date, "gender": gender, "city": city, "email": email, "login": login,
+        }
+        validate_registration(fields, password, password_confirm)
+        new_user = User(password_xor_encoded=xor_cipher(password, self.key), **fields)
+
+        # Проверка дубликатов и запись - под блокировкой записи хранилища (файла или транзакции базы)
+        with self.backend.transaction():
+            # Сначала подгружаем чужие регистрации, чтобы проверка дубликатов была точной
+            self._refresh_locked()
+            with self._lock:
+                self._check_unique(login, email)
+            # Запись на диск (с fsync) - без _lock: вход из других потоков в это время не ждет
+            self.backend.append(new_user) # Одна запись в конец файла (или сегмента) либо строка базы
+            with self._lock:
+                if not self.backend.lazy:
+                    self.store.append(new_user) # Добавляем в список и в индексы
+                self.invalidate_user(login)
+                # Периодически уплотняем журнал, чтобы убрать из файла оборванные записи
+                self.appends_since_compact += 1
+                due = self.appends_since_compact >= self.compact_every
+            if due:
+                self._compact_locked()
+        return new_user
+
+    def _check_unique(self, login, email):
+        """Проверяет, что логин и email еще не заняты."""
+        if self.store.find_by_login(login):
+            raise LoginTakenError(f"Пользователь с логином '{login}' уже существует.")
+        if self.store.find_by_email(email):
+            raise EmailTakenError(f"Пользователь с email '{email}' уже существует.")
+
+    def _compact_locked(self, everything=False):
+        """
+        Уплотнение под уже взятой блокировкой файла (хранилище уже содержит все записи файла).
+        Для разбитого файла бэкенд переписывает только сегменты, изменившиеся с прошлого
+        уплотнения, или все при everything=True; у базы SQLite уплотняется журнал WAL.
+        """
+        with self._lock:
+            users = list(self.store.users) # Копия: файл переписывается без _lock
+            self.appends_since_compact = 0
+        self.backend.compact(users, everything)
+
+    def compact(self):
+        """Уплотняет журнал хранилища: атомарно переписывает файл из хранилища."""
+        with self.backend.transaction():
+            self._refresh_locked() # Не теряем записи других процессов
+            self._compact_locked(everything=True)
+
+    @timed("auth_authenticate")
+    def authenticate(self, login, password):
+        """
+        Проверяет логин и пароль. Возвращает запись User вошедшего пользователя.
+        """
+        if not login or not password:
+            raise ValidationError("Пожалуйста, введите логин и пароль.")
+        user_account = self._find(login)
+        if user_account is None:
+            raise UserNotFoundError("Пользователь с таким логином не найден.")
+        encoded = user_account["password_xor_encoded"]
+
+        # Кэш действителен, только если сохраненный пароль пользователя не менялся
+        # (запись из базы SQLite при каждом поиске - новый объект, поэтому сравниваем пароль, а не запись)
+        # и введен тот же пароль; иначе обращение считается промахом
+        digest = self._password_digest(password)
+        with self._lock:
+            if self.credentials.get(login, valid=lambda cached: cached == (encoded, digest)) is not None:
+                return user_account
+
+        # "Дешифруем" сохраненный пароль (применяем XOR еще раз) и сравниваем
+        if xor_cipher(encoded, self.key) != password:
+            raise WrongPasswordError("Неверный пароль.")
+        with self._lock:
+            self.credentials.put(login, (encoded, digest))
+        return user_account
+
+    def _password_digest(self, password):
+        """Хеш пароля с солью (BLAKE2b с ключом) - для кэша учетных данных."""
+        return hashlib.blake2b(password.encode('utf-8', 'surrogatepass'), key=self._salt, digest_size=16).digest()
+
+    def invalidate_user(self, login):
+        """Сбрасывает кэш и сессии пользователя - вызывается при изменении его записи."""
+        with self._lock:
+            self.credentials.invalidate(login)
+            self.sessions.close_login(login)
+
+    def create_session(self, login, password):
+        """Проверяет логин и пароль и возвращает токен новой сессии."""
+        self.authenticate(login, password)
+        with self._lock:
+            return self.sessions.create(login)
+
+    def get_session_user(self, token):
+        """Возвращает запись пользователя по токену сессии."""
+        with self._lock:
+            login = self.sessions.get_login(token)
+            user_account = self.store.find_by_login(login) if login is not None else None
+        if user_account is None:
+            raise SessionError("Сессия не найдена или истекла.")
+        return user_account
+
+    def close_session(self, token):
+        """Завершает сессию (выход пользователя)."""
+        with self._lock:
+            self.sessions.close(token)
+
+    def cache_stats(self):
+        """Счетчики кэша учетных данных и таблицы сессий."""
+        with self._lock:
+            return {"credentials": self.credentials.stats(), "sessions": self.sessions.stats()}
+
+    def get_profile(self, login):
+        """Возвращает словарь с данными пользователя без пароля."""
+        user_account = self._find(login)
+        if user_account is None:
+            raise UserNotFoundError("Пользователь с таким логином не найден.")
+        return {field: user_account[field] for field in FIELDS if field != "password_xor_encoded"}
+
+    def search_users(self, offset=0, limit=None, **criteria):
+        """
+        Поиск пользователей по условиям user_query.UserQueryIndex.query
+        (city, gender, name_prefix, born_from, born_to). Индекс строится при
+        первом вызове и дальше обновляется вместе с хранилищем.
+        Возвращает (список профилей без пароля, общее количество или None).
+        """
+        from user_query import PAGE_SIZE, UserQueryIndex
+        if self._query_index is None:
+            with self._refresh_lock:
+                index = UserQueryIndex()
+                if self.backend.lazy:
+                    # Пользователей базы нет в памяти: индекс строится из базы и дополняется
+                    # ее новыми записями (refresh), а не через хранилище
+                    index.on_reload(self.backend.load())
+                with self._lock:
+                    if not self.backend.lazy:
+                        self.store.subscribe(index)
+                    self._query_index = index
+        self.refresh() # Регистрации других процессов тоже должны находиться
+        try:
+            with self._lock:
+                page = self._query_index.query(offset=offset, limit=PAGE_SIZE if limit is None else limit,
+                                               **criteria)
+        except ValueError as error:
+            raise ValidationError(str(error))
+        profiles = [{field: user_account[field] for field in FIELDS if field != "password_xor_encoded"}
+                    for user_account in page.items]
+        return profiles, page.total
+
+
+def run_benchmark(users_count=10000, rounds=5):
+    """
+    Headless-замер: регистрирует 'users_count' пользователей во временном файле,
+    затем выполняет 'rounds' проходов входа по всем. Возвращает число операций в секунду.
+    """
+    import tempfile # Нужен только для замеров - не замедляет импорт модуля
+    with tempfile.TemporaryDirectory() as directory:
+        service = AuthService(os.path.join(directory, "users.data"))
+        started = time.perf_counter()
+        for i in range(users_count):
+            service.register(f"Фамилия{i}", "Имя", "", "01.01.2000", "Мужской", "Москва",
+                             f"user{i}@mail.ru", f"user{i}", f"pw{i}", f"pw{i}")
+        register_rate = users_count / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for i in range(users_count):
+                service.authenticate(f"user{i}", f"pw{i}")
+        login_rate = users_count * rounds / (time.perf_counter() - started)
+    return {"register_per_sec": register_rate, "login_per_sec": login_rate}
+
+
+def _stress_register(service, login):
+    service.register("Стресс", "Тест", "", "01.01.2000", "Мужской", "Москва",
+                     f"{login}@stress.test", login, "pw", "pw")
+
+
+def _stress_worker(filename, worker, users_count, compact_every):
+    """
+    Процесс стресс-теста: регистрирует свою порцию пользователей в общем файле.
+    Нулевой процесс уплотняет файл после каждой записи (файл постоянно заменяется),
+    а в конце каждый процесс выполняет явное уплотнение из своего хранилища.
+    """
+    service = AuthService(filename, compact_every=1 if worker == 0 else compact_every)
+    service.load()
+    for i in range(users_count):
+        _stress_register(service, f"w{worker}_{i}")
+    service.compact()
+
+
+def _replace_scenario(filename):
+    """
+    Детерминированная проверка замены файла: в файле есть оборванная строка, процесс A
+    загружает его, процесс B дважды регистрируется с уплотнением после каждой записи
+    (на ext4 второй файл может получить прежний номер inode), затем A регистрируется
+    и уплотняет файл. Записи B не должны потеряться.
+    Возвращает множество логинов, которые должны быть в файле.
+    """
+    manifest = read_manifest(filename)
+    data_file = shard_files(filename, manifest)[0] if manifest is not None else filename
+    with open(data_file, 'a', encoding='utf-8') as file:
+        file.write("Оборванная;запись") # Строка без перевода строки и без части полей
+    first = AuthService(filename)
+    first.load()
+    second = AuthService(filename, compact_every=1)
+    second.load()
+    for login in ("replace_b0", "replace_b1"):
+        _stress_register(second, login)
+    _stress_register(first, "replace_a0")
+    first.compact()
+    return {"replace_b0", "replace_b1", "replace_a0"}
+
+
+def run_stress(processes=4, users_count=200, compact_every=50, shards=0, sqlite=False):
+    """
+    Многопроцессный стресс-тест: сначала сценарий замены файла (_replace_scenario),
+    затем 'processes' процессов одновременно регистрируют пользователей в одном
+    файле с уплотнением (файл заменяется, пока другие его читают), после чего
+    проверяется, что ни одна учетная запись не потеряна.
+    Если 'shards' больше 0, файл заранее разбивается на столько сегментов.
+    sqlite=True - те же регистрации в базе SQLite users.db (без сценария замены файла).
+    Возвращает кортеж (ожидалось, найдено в файле).
+    """
+    import multiprocessing # Нужны только для стресс-теста - не замедляют импорт модуля
+    import tempfile
+    if sqlite and shards:
+        raise ValueError("База SQLite не разбивается на сегменты.")
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "users.db" if sqlite else "users.data")
+        if shards:
+            from user_shards import reshard
+            reshard(filename, shards)
+        expected = set() if sqlite else _replace_scenario(filename)
+        workers = [multiprocessing.Process(target=_stress_worker, args=(filename, worker, users_count, compact_every))
+                   for worker in range(processes)]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+        with open_backend(filename) as backend:
+            logins = {user_data["login"] for user_data in backend}
+        expected |= {f"w{worker}_{i}" for worker in range(processes) for i in range(users_count)}
+        return len(expected), len(expected & logins)
+
+
+def main(argv=None):
+    """
+    Точка входа без GUI:
+        python auth_service.py login ЛОГИН ПАРОЛЬ
+        python auth_service.py profile ЛОГИН
+        python auth_service.py bench --users 10000
+        python auth_service.py stress --processes 4 --users 200 --shards 8
+        python auth_service.py stress --processes 4 --users 200 --sqlite
+    """
+    parser = argparse.ArgumentParser(description="Сервис регистрации и входа без графического интерфейса.")
+    parser.add_argument('--file', default=FILENAME, help="Файл пользователей")
+    commands = parser.add_subparsers(dest='command', required=True)
+    login_parser = commands.add_parser('login', help="Проверить логин и пароль")
+    login_parser.add_argument('login')
+    login_parser.add_argument('password')
+    profile_parser = commands.add_parser('profile', help="Показать данные пользователя")
+    profile_parser.add_argument('login')
+    bench_parser = commands.add_parser('bench', help="Замер скорости регистрации и входа")
+    bench_parser.add_argument('--users', type=int, default=10000, help="Количество пользователей")
+    bench_parser.add_argument('--rounds', type=int, default=5, help="Проходов входа по всем пользователям")
+    stress_parser = commands.add_parser('stress', help="Многопроцессный стресс-тест записи в общий файл")
+    stress_parser.add_argument('--processes', type=int, default=4, help="Количество процессов")
+    stress_parser.add_argument('--users', type=int, default=200, help="Регистраций на процесс")
+    stress_parser.add_argument('--compact-every', type=int, default=50, help="Частота уплотнения")
+    stress_parser.add_argument('--shards', type=int, default=0, help="Разбить файл на сегменты (0 - не разбивать)")
+    stress_parser.add_argument('--sqlite', action='store_true', help="Проверить базу SQLite вместо CSV-файла")
+    args = parser.parse_args(argv)
+
+    if args.command == 'stress':
+        expected, found = run_stress(args.processes, args.users, args.compact_every, args.shards, args.sqlite)
+        print(f"Ожидалось {expected} учетных записей, в файле найдено {found}.")
+        return 0 if expected == found else 1
+
+    if args.command == 'bench':
+        result = run_benchmark(args.users, args.rounds)
+        print(f"Регистрация: {result['register_per_sec']:.0f} оп/с, вход: {result['login_per_sec']:.0f} оп/с")
+        return 0
+
+    service = AuthService(args.file)
+    service.load()
+    try:
+        if args.command == 'login':
+            user_account = service.authenticate(args.login, args.password)
+            print(f"Добро пожаловать, {user_account['first_name']} {user_account['last_name']}!")
+        else:
+            for field, value in service.get_profile(args.login).items():
+                print(f"{field}: {value}")
+    except AuthError as error:
+        print(f"Ошибка: {error}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,178 @@
+"""
+Набор замеров производительности основных операций.
+
+Генерирует синтетические файлы users.data (по умолчанию 1 тыс., 100 тыс.
+и 1 млн строк) и замеряет:
+  - load_users и save_users;
+  - find_user_by_login (линейный поиск по списку и поиск по индексу UserStore);
+  - регистрацию и вход через AuthService без GUI;
+  - xor_cipher и xor_base64_cipher на входах разного размера.
+Для каждой операции выводятся пропускная способность, перцентили задержки
+и пиковая память (tracemalloc) в формате JSON, чтобы результаты разных
+запусков можно было сравнивать.
+
+    python benchmark.py --sizes 1000 100000 --output bench_output.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from auth_service import AuthService
+from metrics import percentile
+from user_data import XOR_KEY, xor_cipher, load_users, save_users, find_user_by_login
+from user_record import User
+from user_store import UserStore
+from xor_cipher import xor_base64_cipher
+
+DEFAULT_SIZES = (1000, 100000, 1000000)
+CIPHER_SIZES = (16, 1024, 64 * 1024, 1024 * 1024) # Длины входа для замеров шифра (символов)
+
+
+def generate_users_file(filename, count, seed=0):
+    """Создает синтетический users.data из 'count' пользователей."""
+    rng = random.Random(seed)
+    cities = ["Москва", "Санкт-Петербург", "Казань", "Новосибирск", "Екатеринбург", "Самара", "Омск"]
+    genders = ["Мужской", "Женский"]
+    users = []
+    for i in range(count):
+        users.append(User(
+            last_name=f"Фамилия{i}", first_name=f"Имя{rng.randrange(500)}", middle_name=f"Отчество{rng.randrange(300)}",
+            birth_date=f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(1940, 2010)}",
+            gender=rng.choice(genders), city=rng.choice(cities), email=f"user{i}@mail.ru", login=f"user{i}",
+            password_xor_encoded=xor_cipher(f"pw{i}", XOR_KEY)))
+    save_users(users, filename)
+
+
+def measure(function, repeat, trace_memory=True):
+    """
+    Вызывает 'function' 'repeat' раз и возвращает статистику:
+    число вызовов, вызовов в секунду, p50/p99 задержки и пиковую память.
+    Пиковая память замеряется отдельным вызовом под tracemalloc,
+    чтобы трассировка не искажала время.
+    """
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    total = sum(latencies)
+    result = {
+        "calls": repeat,
+        "ops_per_sec": repeat / total if total else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+    if trace_memory:
+        tracemalloc.start()
+        function()
+        result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def bench_users(count, directory, repeat):
+    """Замеры файловых операций, поиска и регистрации для файла из 'count' строк."""
+    filename = os.path.join(directory, f"users_{count}.data")
+    generate_users_file(filename, count)
+    results = {"rows": count, "file_bytes": os.path.getsize(filename)}
+
+    results["load_users"] = measure(lambda: load_users(filename), repeat)
+    results["load_users"]["rows_per_sec"] = results["load_users"]["ops_per_sec"] * count
+    users = load_users(filename)
+
+    save_target = os.path.join(directory, "save_target.data")
+    results["save_users"] = measure(lambda: save_users(users, save_target), repeat)
+    results["save_users"]["rows_per_sec"] = results["save_users"]["ops_per_sec"] * count
+
+    # Поиск: случайные существующие логины; линейный поиск медленный, поэтому выборка меньше
+    rng = random.Random(1)
+    logins = [f"user{rng.randrange(count)}" for _ in range(1000)]
+    linear_logins = iter(logins * 1000)
+    results["find_user_by_login_list"] = measure(
+        lambda: find_user_by_login(users, next(linear_logins)), min(len(logins), max(10, 10 ** 7 // count)),
+        trace_memory=False)
+    store = UserStore(users)
+    indexed_logins = iter(logins * 1000)
+    results["find_user_by_login_index"] = measure(
+        lambda: find_user_by_login(store, next(indexed_logins)), len(logins), trace_memory=False)
+
+    # Регистрация и вход через сервис на копии файла
+    service_file = os.path.join(directory, "service.data")
+    shutil.copyfile(filename, service_file)
+    service = AuthService(service_file)
+    started = time.perf_counter()
+    service.load()
+    results["auth_service_load_ms"] = (time.perf_counter() - started) * 1000
+    counter = iter(range(10 ** 9))
+
+    def round_trip():
+        i = next(counter)
+        login = f"bench{i}"
+        service.register("Замер", "Тест", "", "01.01.2000", "Мужской", "Москва",
+                         f"{login}@bench.test", login, "pw", "pw")
+        service.authenticate(login, "pw")
+
+    results["register_login_round_trip"] = measure(round_trip, 200, trace_memory=False)
+    return results
+
+
+def bench_cipher(repeat):
+    """Замеры xor_cipher и xor_base64_cipher на входах разной длины."""
+    results = []
+    rng = random.Random(2)
+    for size in CIPHER_SIZES:
+        text = "".join(rng.choice("abcdefghijАБВГДежзий0123456789") for _ in range(size))
+        calls = max(3, min(repeat * 100, 10 ** 7 // size))
+        encoded = xor_base64_cipher(text, XOR_KEY, action='encode')
+        entry = {
+            "chars": size,
+            "xor_cipher": measure(lambda: xor_cipher(text, XOR_KEY), calls),
+            "xor_base64_encode": measure(lambda: xor_base64_cipher(text, XOR_KEY, action='encode'), calls),
+            "xor_base64_decode": measure(lambda: xor_base64_cipher(encoded, XOR_KEY, action='decode'), calls),
+        }
+        for name in ("xor_cipher", "xor_base64_encode", "xor_base64_decode"):
+            entry[name]["chars_per_sec"] = entry[name]["ops_per_sec"] * size
+        results.append(entry)
+    return results
+
+
+def run(sizes=DEFAULT_SIZES, repeat=5):
+    """Выполняет все замеры и возвращает результат в виде словаря."""
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "users": [],
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for count in sizes:
+            report["users"].append(bench_users(count, directory, repeat))
+    report["cipher"] = bench_cipher(repeat)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности (результат в JSON).")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help="Размеры файлов (строк)")
+    parser.add_argument('--repeat', type=int, default=5, help="Повторов для загрузки и сохранения")
+    parser.add_argument('--output', help="Файл для JSON-отчета (по умолчанию - стандартный вывод)")
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.repeat)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Пакетный импорт и экспорт пользователей (миграция учетных записей партнера).
+
+Формат файла партнера - тот же CSV с разделителем ';' и 9 полями, что и
+users.data, но пароль в последнем поле указан открытым текстом.
+
+Импорт:
+  1. Исходный файл делится на диапазоны байтов по 'chunk_bytes' (границы
+     сдвигаются к началу строки; запись партнера занимает одну строку).
+  2. Процессы пула сами читают свои диапазоны, разбирают CSV, проверяют строки
+     по тем же правилам, что и форма регистрации (validate_registration),
+     кодируют пароли XOR и формируют CSV-строки. В основной процесс возвращаются
+     готовый текст и пары (логин, email) принятых строк.
+  3. Основной процесс только отсекает дубликаты логинов и email по множествам
+     (в порядке строк исходного файла - первая запись побеждает).
+  4. Готовые блоки за один проход дописываются в users.data под блокировкой.
+Экспорт выполняет обратное преобразование, также в пуле процессов.
+Если рядом с users.data есть двоичный снимок users.bin (users_binary.py),
+импорт проверяет дубликаты и по нему, а экспорт выгружает и его записи.
+
+    python bulk_users.py import partner.csv --workers 4
+    python bulk_users.py export partner_out.csv
+"""
+import argparse
+import csv
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from auth_service import AuthError, validate_registration
+from user_data import FILENAME, XOR_KEY, iter_users, file_lock
+from user_record import FIELDS, email_key
+from user_shards import read_manifest, shard_files
+from users_binary import BinaryUserFile, snapshot_path
+from xor_engine import xor_text_batch
+
+CHUNK_SIZE = 10000 # Строк в одной порции, передаваемой в процесс пула (экспорт)
+CHUNK_BYTES = 4 * 1024 * 1024 # Байт исходного файла в одном диапазоне (импорт)
+
+
+def _convert_chunk(rows, key):
+    """
+    Работа процесса пула при экспорте: декодирует пароли (последнее поле) всей
+    порции за один вызов XOR и возвращает готовый CSV-текст.
+    """
+    passwords = xor_text_batch([row[8] for row in rows], key)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    for row, password in zip(rows, passwords):
+        writer.writerow(row[:8] + [password])
+    return buffer.getvalue()
+
+
+def _byte_ranges(filename, chunk_bytes):
+    """Делит файл на диапазоны байтов [начало, конец) длиной до 'chunk_bytes'."""
+    size = os.path.getsize(filename)
+    return [(start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)]
+
+
+def _import_range(filename, start, end, key):
+    """
+    Работа процесса пула при импорте: обрабатывает строки, которые начинаются
+    в диапазоне байтов [start, end). Строку, начатую в предыдущем диапазоне,
+    пропускает - ее целиком прочитает предыдущий процесс.
+    Возвращает (прочитано строк, некорректных, пары (логин, email в нижнем регистре),
+    CSV-текст принятых строк, позиции конца каждой строки в этом тексте).
+    """
+    lines = []
+    with open(filename, 'rb') as file:
+        if start > 0:
+            file.seek(start - 1)
+            file.readline() # Дочитываем чужую строку (или только ее перевод строки)
+        while file.tell() < end:
+            line = file.readline()
+            if not line:
+                break
+            lines.append(line)
+
+    read = invalid = 0
+    keys = []
+    rows = []
+    for row in csv.reader(io.StringIO(b"".join(lines).decode('utf-8'), newline=''), delimiter=';'):
+        read += 1
+        if len(row) != 9:
+            invalid += 1
+            continue
+        fields = dict(zip(FIELDS[:8], row[:8]))
+        try:
+            validate_registration(fields, row[8], row[8])
+        except AuthError:
+            invalid += 1
+            continue
+        keys.append((fields["login"], email_key(fields["email"])))
+        rows.append(row)
+
+    passwords = xor_text_batch([row[8] for row in rows], key) # Все пароли диапазона - одним вызовом
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    ends = []
+    for row, password in zip(rows, passwords):
+        writer.writerow(row[:8] + [password])
+        ends.append(buffer.tell())
+    return read, invalid, keys, buffer.getvalue(), ends
+
+
+def _read_chunks(filename, chunk_size):
+    """Потоково читает CSV-файл и выдает порции строк по 'chunk_size'."""
+    with open(filename, newline='', encoding='utf-8') as file:
+        chunk = []
+        for row in csv.reader(file, delimiter=';'):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _iter_snapshot(filename):
+    """Перебирает пользователей двоичного снимка (users_binary.py) и закрывает его в конце."""
+    with BinaryUserFile(filename) as snapshot:
+        yield from snapshot
+
+
+def _snapshot_chunks(snapshot, chunk_size):
+    """Выдает записи двоичного снимка порциями строк по 'chunk_size', как _read_chunks."""
+    chunk = []
+    for user_data in snapshot:
+        chunk.append(user_data.to_row())
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _ends_without_newline(filename):
+    """Проверяет, что непустой файл не заканчивается переводом строки."""
+    with open(filename, 'rb') as file:
+        file.seek(0, os.SEEK_END)
+        if file.tell() == 0:
+            return False
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) != b"\n"
+
+
+def _pipeline(chunks, output, key, workers):
+    """
+    Передает порции в пул процессов, удерживая в работе не больше 2*workers порций
+    (память ограничена), и записывает результаты в 'output' в исходном порядке.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for rows in chunks:
+            pending.append(pool.submit(_convert_chunk, rows, key))
+            if len(pending) >= 2 * workers:
+                output.write(pending.pop(0).result())
+        for future in pending:
+            output.write(future.result())
+
+
+def import_users(source_filename, target_filename=FILENAME, key=XOR_KEY, workers=None, chunk_bytes=CHUNK_BYTES):
+    """
+    Импортирует пользователей из файла партнера в users.data.
+    Возвращает словарь со статистикой: принято, отклонено по причинам, строк в секунду.
+    """
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    stats = {"read": 0, "imported": 0, "invalid": 0, "duplicate_login": 0, "duplicate_email": 0}
+
+    if read_manifest(target_filename) is not None:
+        # Блоки дописываются в один файл; сегменты пришлось бы заполнять по отдельности
+        raise ValueError(f"Файл '{target_filename}' разбит на сегменты: сначала соберите его "
+                         f"(python user_shards.py merge).")
+
+    with file_lock(target_filename):
+        # Множества существующих логинов и email - для проверки дубликатов за O(1)
+        logins = set()
+        emails = set()
+        existing = [iter_users(target_filename, fields=("login", "email"))]
+        snapshot_filename = snapshot_path(target_filename)
+        if os.path.exists(snapshot_filename):
+            existing.insert(0, _iter_snapshot(snapshot_filename)) # Записи двоичного снимка тоже заняты
+        for users in existing:
+            for user_data in users:
+                logins.add(user_data["login"])
+                emails.add(email_key(user_data["email"]))
+
+        def accept(result):
+            """Отсекает дубликаты в результате одного диапазона и возвращает текст принятых строк."""
+            read, invalid, keys, text, ends = result
+            stats["read"] += read
+            stats["invalid"] += invalid
+            parts = []
+            begin = 0
+            for (login, email), end in zip(keys, ends):
+                if login in logins:
+                    stats["duplicate_login"] += 1
+                elif email in emails:
+                    stats["duplicate_email"] += 1
+                else:
+                    logins.add(login)
+                    emails.add(email)
+                    parts.append(text[begin:end])
+                    stats["imported"] += 1
+                begin = end
+            return "".join(parts)
+
+        # Все блоки дописываются в конец файла за один проход
+        with open(target_filename, 'a', newline='', encoding='utf-8') as output, \
+                ProcessPoolExecutor(max_workers=workers) as pool:
+            if _ends_without_newline(target_filename):
+                output.write("\n") # Отделяем оборванную последнюю запись, как append_user
+            pending = []
+            for start, end in _byte_ranges(source_filename, chunk_bytes):
+                pending.append(pool.submit(_import_range, source_filename, start, end, key))
+                if len(pending) >= 2 * workers: # Не больше 2*workers диапазонов в работе - память ограничена
+                    output.write(accept(pending.pop(0).result()))
+            for future in pending:
+                output.write(accept(future.result()))
+            output.flush()
+            os.fsync(output.fileno())
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = elapsed
+    stats["rows_per_sec"] = stats["read"] / elapsed if elapsed else 0.0
+    return stats
+
+
+def export_users(target_filename, source_filename=FILENAME, key=XOR_KEY, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Экспортирует users.data в формат партнера (пароли открытым текстом).
+    Возвращает словарь со статистикой: строк и строк в секунду.
+    """
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    stats = {"exported": 0}
+
+    manifest = read_manifest(source_filename)
+    # Разбитый файл экспортируется сегмент за сегментом (см. user_shards.py)
+    paths = shard_files(source_filename, manifest) if manifest is not None else [source_filename]
+
+    def valid_chunks(snapshot):
+        # Сначала записи двоичного снимка, затем журнал без логинов снимка (как users_binary.binary_to_csv)
+        if snapshot is not None:
+            for rows in _snapshot_chunks(snapshot, chunk_size):
+                stats["exported"] += len(rows)
+                yield rows
+        for path in paths:
+            for rows in _read_chunks(path, chunk_size):
+                # Те же правила, что и в load_users; логин - 8-е поле
+                rows = [row for row in rows if len(row) == 9 and (snapshot is None or row[7] not in snapshot)]
+                stats["exported"] += len(rows)
+                if rows:
+                    yield rows
+
+    with file_lock(source_filename, exclusive=False), \
+            open(target_filename, 'w', newline='', encoding='utf-8') as output:
+        snapshot_filename = snapshot_path(source_filename)
+        snapshot = BinaryUserFile(snapshot_filename) if os.path.exists(snapshot_filename) else None
+        try:
+            _pipeline(valid_chunks(snapshot), output, key, workers)
+        finally:
+            if snapshot is not None:
+                snapshot.close()
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = elapsed
+    stats["rows_per_sec"] = stats["exported"] / elapsed if elapsed else 0.0
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный импорт и экспорт пользователей.")
+    parser.add_argument('command', choices=['import', 'export'], help="Действие")
+    parser.add_argument('partner_file', help="Файл партнера (источник для импорта или результат экспорта)")
+    parser.add_argument('--file', default=FILENAME, help="Файл пользователей")
+    parser.add_argument('--workers', type=int, default=None, help="Количество процессов (по умолчанию - число ядер)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Строк в одной порции (экспорт)")
+    parser.add_argument('--chunk-bytes', type=int, default=CHUNK_BYTES, help="Байт в одном диапазоне (импорт)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        stats = import_users(args.partner_file, args.file, workers=args.workers, chunk_bytes=args.chunk_bytes)
+        print(f"Прочитано {stats['read']}, импортировано {stats['imported']}, некорректных {stats['invalid']}, "
+              f"дубликатов логина {stats['duplicate_login']}, дубликатов email {stats['duplicate_email']}. "
+              f"{stats['rows_per_sec']:.0f} строк/с.")
+    else:
+        stats = export_users(args.partner_file, args.file, workers=args.workers, chunk_size=args.chunk_size)
+        print(f"Экспортировано {stats['exported']} пользователей. {stats['rows_per_sec']:.0f} строк/с.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,94 +1,60 @@
-import csv # Модуль для работы с CSV файлами (хранение данных пользователей)
-import tkinter as tk # Модуль для создания графического интерфейса пользователя (GUI)
-from tkinter import messagebox # Модуль для отображения стандартных диалоговых окон (сообщения, ошибки)
+import time # Модуль для замера времени запуска
+STARTED_AT = time.perf_counter() # Момент начала импорта программы - для замера холодного старта
+
+import threading # Модуль для фоновой загрузки пользователей
+# Модуль tkinter (GUI) импортируется только в main(): импорт kursach_02 ради функций
+# работы с данными не тянет за собой Tk.
+# Функции работы с данными вынесены в user_data.py и импортируются сюда для совместимости
+from user_data import (FILENAME, XOR_KEY, xor_cipher, load_users, user_to_row, save_users,
+                       append_user, compact_users, find_user_by_login)
+from user_store import UserStore # Хранилище пользователей с хеш-индексами по логину и email
+from auth_service import AuthService, AuthError # Логика регистрации и входа без GUI
+from metrics import timer # Необязательный замер времени обработчиков (KURSACH_METRICS=1)
 
 # --- Константы и глобальные переменные ---
-FILENAME = "users.data" # Имя файла для хранения данных пользователей. Файл будет в папке запуска скрипта.
-XOR_KEY = "SimpleKey"   # Простой ключ для XOR "шифрования". В реальных системах использовать нельзя!
-user_list = []          # Глобальный список для хранения данных всех пользователей в памяти.
+user_store = UserStore() # Хранилище пользователей в памяти с индексами для быстрого поиска.
+user_list = user_store.users # Глобальный список для хранения данных всех пользователей в памяти.
+auth_service = AuthService(FILENAME, user_store, XOR_KEY) # Сервис регистрации и входа поверх хранилища.
 current_logged_in_user = None # Переменная для хранения данных текущего вошедшего пользователя.
+current_session_token = None # Токен сессии текущего вошедшего пользователя.
+LOAD_WAIT_SECONDS = 5.0 # Сколько ждать окончания фоновой загрузки при попытке входа или регистрации.
+users_ready = threading.Event() # Устанавливается, когда пользователи загружены и индексы построены.
+load_error = None # Ошибка фоновой загрузки (если она произошла).
 
-# --- Функции для работы с данными ---
-
-def xor_cipher(text, key):
-  """
-  Кодирует или декодирует текст с помощью битовой операции XOR.
-  Принимает строку 'text' и строку 'key'.
-  Возвращает строку, являющуюся результатом операции XOR.
-  Внимание: результат может содержать непечатные символы,
-  так как операция XOR применяется к кодам символов.
-  """
-  # Если ключ короче текста, он будет циклически повторяться.
-  repeated_key = (key * (len(text) // len(key) + 1))[:len(text)]
-  # Применяем операцию XOR к кодам Unicode каждого символа текста и ключа.
-  # ord(char) - возвращает Unicode код символа.
-  # chr(code) - возвращает символ по его Unicode коду.
-  # ^ - оператор XOR.
-  result = ''.join(chr(ord(a) ^ ord(b)) for a, b in zip(text, repeated_key))
-  return result
-
-def load_users(filename):
-  """
-  Загружает список пользователей из указанного файла.
-  Если файл не существует, он будет создан при первой попытке записи (режим 'a+').
-  """
-  users = [] # Локальный список для загруженных пользователей
-  # Открываем файл в режиме 'a+' (добавление и чтение).
-  # Файл создается, если не существует.
-  # newline='' и encoding='utf-8' важны для корректной работы с CSV и кириллицей.
-  with open(filename, 'a+', newline='', encoding='utf-8') as file:
-      file.seek(0) # Перемещаем курсор в начало файла для чтения существующих записей.
-      reader = csv.reader(file, delimiter=';') # Создаем объект для чтения CSV, разделитель - точка с запятой.
-      for row in reader: # Читаем файл построчно
-          if row and len(row) == 9: # Проверяем, что строка не пустая и содержит 9 полей
-              # Создаем словарь с данными пользователя
-              user_data = {
-                  "last_name": row[0],
-                  "first_name": row[1],
-                  "middle_name": row[2],
-                  "birth_date": row[3],
-                  "gender": row[4],
-                  "city": row[5],
-                  "email": row[6],
-                  "login": row[7],
-                  "password_xor_encoded": row[8] # Пароль хранится в "зашифрованном" XOR виде
-              }
-              users.append(user_data) # Добавляем пользователя в список
-  return users
-
-
-def save_users(users, filename):
-  """
-  Сохраняет текущий список пользователей в указанный файл.
-  Файл перезаписывается при каждом сохранении (режим 'w').
-  """
-  # Открываем файл в режиме 'w' (запись). Если файл существует, он будет перезаписан.
-  with open(filename, 'w', newline='', encoding='utf-8') as file:
-      writer = csv.writer(file, delimiter=';') # Создаем объект для записи CSV.
-      for user_data_item in users: # Проходим по каждому пользователю в списке
-          # Записываем данные пользователя в файл одной строкой
-          writer.writerow([
-              user_data_item["last_name"],
-              user_data_item["first_name"],
-              user_data_item["middle_name"],
-              user_data_item["birth_date"],
-              user_data_item["gender"],
-              user_data_item["city"],
-              user_data_item["email"],
-              user_data_item["login"],
-              user_data_item["password_xor_encoded"] # Сохраняем XOR "зашифрованный" пароль
-          ])
-
-
-def find_user_by_login(users_list_to_search, login_to_find):
-  """
-  Ищет пользователя в предоставленном списке по логину.
-  Возвращает словарь с данными пользователя, если найден, иначе None.
-  """
-  for user_data_item in users_list_to_search:
-    if user_data_item["login"] == login_to_find:
-      return user_data_item # Пользователь найден
-  return None # Пользователь не найден
+# --- Фоновая загрузка пользователей ---
+
+def load_users_in_background():
+    """
+    Загружает пользователей и строит индексы в фоновом потоке,
+    чтобы окно программы появлялось сразу, не дожидаясь разбора файла.
+    """
+    global load_error
+    started = time.perf_counter()
+    try:
+        # Если есть двоичный снимок users.bin, хранилище только отображает его в память,
+        # а записи разбираются при поиске. В CSV-файле остаются регистрации после снимка.
+        auth_service.load() # Загружаем пользователей из файла и строим индексы
+        if user_store.base is not None:
+            print(f"Подключен двоичный файл '{user_store.base.filename}' ({len(user_store.base)} пользователей).")
+        print(f"Загружено {len(user_list)} пользователей из файла '{FILENAME}' "
+              f"за {time.perf_counter() - started:.3f} с.") # Информационное сообщение в консоль
+    except Exception as error:
+        load_error = error
+    finally:
+        users_ready.set()
+
+def wait_for_users():
+    """
+    Ждет окончания фоновой загрузки (не дольше LOAD_WAIT_SECONDS).
+    Возвращает True, если пользователи загружены и можно продолжать.
+    """
+    if not users_ready.wait(LOAD_WAIT_SECONDS):
+        messagebox.showwarning("Подождите", "Список пользователей еще загружается. Попробуйте через несколько секунд.")
+        return False
+    if load_error is not None:
+        messagebox.showerror("Ошибка загрузки", f"Не удалось загрузить пользователей: {load_error}")
+        return False
+    return True
 
 # --- Функции для GUI (Графического Интерфейса Пользователя) ---
 
@@ -154,85 +120,57 @@ def display_user_info(user_data_to_display):
 
 def handle_login():
     """Обрабатывает нажатие кнопки 'Войти'."""
+    if not wait_for_users(): # Вход возможен только после загрузки пользователей
+        return
     login_attempt = login_entry_login.get() # Получаем введенный логин
     password_attempt = password_entry_login.get() # Получаем введенный пароль
 
-    # Проверка, что поля не пустые
-    if not login_attempt or not password_attempt:
-        messagebox.showerror("Ошибка входа", "Пожалуйста, введите логин и пароль.")
+    # Проверку логина и пароля выполняет сервис; при ошибке он бросает AuthError.
+    # Замеряется только работа сервиса: ожидание загрузки и окна сообщений в замер не входят.
+    global current_session_token
+    try:
+        with timer("gui_handle_login"):
+            current_session_token = auth_service.create_session(login_attempt, password_attempt)
+            user_account = auth_service.get_session_user(current_session_token)
+    except AuthError as error:
+        messagebox.showerror("Ошибка входа", str(error))
         return
 
-    # Ищем пользователя по логину
-    user_account = find_user_by_login(user_list, login_attempt)
-
-    if user_account: # Если пользователь найден
-        # "Дешифруем" сохраненный пароль (применяем XOR еще раз)
-        stored_password_decoded = xor_cipher(user_account["password_xor_encoded"], XOR_KEY)
-
-        if password_attempt == stored_password_decoded: # Сравниваем пароли
-            # Формируем имя для приветствия
-            user_name_for_greeting = user_account.get('first_name', 'Пользователь')
-            if user_account.get('last_name'):
-                 user_name_for_greeting = f"{user_account.get('first_name', '')} {user_account.get('last_name', '')}".strip()
-            
-            # Показываем сообщение об успешном входе
-            messagebox.showinfo("Успешный вход", f"Добро пожаловать, {user_name_for_greeting}!")
-            
-            clear_entries([login_entry_login, password_entry_login]) # Очищаем поля ввода
-            display_user_info(user_account) # Показываем информацию о пользователе
-        else:
-            messagebox.showerror("Ошибка входа", "Неверный пароль.") # Пароли не совпали
-    else:
-        messagebox.showerror("Ошибка входа", "Пользователь с таким логином не найден.") # Пользователь не найден
+    # Формируем имя для приветствия
+    user_name_for_greeting = user_account.get('first_name', 'Пользователь')
+    if user_account.get('last_name'):
+         user_name_for_greeting = f"{user_account.get('first_name', '')} {user_account.get('last_name', '')}".strip()
+
+    # Показываем сообщение об успешном входе
+    messagebox.showinfo("Успешный вход", f"Добро пожаловать, {user_name_for_greeting}!")
+
+    clear_entries([login_entry_login, password_entry_login]) # Очищаем поля ввода
+    display_user_info(user_account) # Показываем информацию о пользователе
 
 def handle_register():
     """Обрабатывает нажатие кнопки 'Зарегистрироваться' на форме регистрации."""
-    # Получаем данные из всех полей ввода на форме регистрации
-    last_name = last_name_entry_reg.get()
-    first_name = first_name_entry_reg.get()
-    middle_name = middle_name_entry_reg.get()
-    birth_date = birth_date_entry_reg.get()
-    gender = gender_var.get() # Значение из Radiobutton
-    city = city_entry_reg.get()
-    email = email_entry_reg.get()
-    login = login_entry_reg.get()
-    password = password_entry_reg.get()
-    password_confirm = password_confirm_entry_reg.get()
-
-    # Проверка на заполненность обязательных полей
-    if not all([last_name, first_name, birth_date, gender, city, email, login, password, password_confirm]):
-        messagebox.showerror("Ошибка регистрации", "Пожалуйста, заполните все обязательные поля (кроме Отчества).")
+    if not wait_for_users(): # Проверка дубликатов возможна только после загрузки пользователей
         return
-
-    # Проверка совпадения паролей
-    if password != password_confirm:
-        messagebox.showerror("Ошибка регистрации", "Пароли не совпадают.")
+    # Передаем данные из всех полей ввода сервису: он проверит их,
+    # "зашифрует" пароль с помощью XOR и допишет пользователя в файл.
+    try:
+        with timer("gui_handle_register"): # Только работа сервиса, без окон сообщений
+            auth_service.register(
+                last_name=last_name_entry_reg.get(),
+                first_name=first_name_entry_reg.get(),
+                middle_name=middle_name_entry_reg.get(),
+                birth_date=birth_date_entry_reg.get(),
+                gender=gender_var.get(), # Значение из Radiobutton
+                city=city_entry_reg.get(),
+                email=email_entry_reg.get(),
+                login=login_entry_reg.get(),
+                password=password_entry_reg.get(),
+                password_confirm=password_confirm_entry_reg.get()
+            )
+    except AuthError as error:
+        messagebox.showerror("Ошибка регистрации", str(error))
         return
 
-    # Проверка, не занят ли логин
-    if find_user_by_login(user_list, login):
-        messagebox.showerror("Ошибка регистрации", f"Пользователь с логином '{login}' уже существует.")
-        return
-
-    # "Шифрование" пароля с помощью XOR
-    password_xor_encoded = xor_cipher(password, XOR_KEY)
-
-    # Создание словаря с данными нового пользователя
-    new_user = {
-        "last_name": last_name,
-        "first_name": first_name,
-        "middle_name": middle_name,
-        "birth_date": birth_date,
-        "gender": gender,
-        "city": city,
-        "email": email,
-        "login": login,
-        "password_xor_encoded": password_xor_encoded
-    }
-
-    user_list.append(new_user) # Добавляем нового пользователя в общий список
-    save_users(user_list, FILENAME) # Сохраняем обновленный список в файл
-
     messagebox.showinfo("Успешная регистрация", "Пользователь успешно зарегистрирован!")
     # Очищаем все поля на форме регистрации
     clear_entries([
@@ -244,10 +182,25 @@ def handle_register():
     gender_var.set("") # Сброс выбора пола
     show_frame(login_frame) # Переход на экран входа
 
+def update_load_status():
+    """
+    Обновляет строку состояния загрузки. Виджеты Tk можно менять только
+    из главного потока, поэтому состояние фонового потока опрашивается по таймеру.
+    """
+    if not users_ready.is_set():
+        window.after(100, update_load_status)
+    elif load_error is not None:
+        load_status_label.config(text="Ошибка загрузки пользователей", fg="red")
+    else:
+        load_status_label.config(text=f"Пользователей: {len(user_list)}")
+
 def handle_logout():
     """Обрабатывает нажатие кнопки 'Выйти' на экране информации о пользователе."""
-    global current_logged_in_user
+    global current_logged_in_user, current_session_token
     current_logged_in_user = None # Сбрасываем данные о вошедшем пользователе
+    if current_session_token is not None:
+        auth_service.close_session(current_session_token) # Завершаем сессию
+        current_session_token = None
     show_frame(login_frame) # Показываем экран входа
 
 
@@ -261,7 +214,13 @@ def main():
     global last_name_entry_reg, first_name_entry_reg, middle_name_entry_reg
     global birth_date_entry_reg, gender_var, city_entry_reg, email_entry_reg
     global login_entry_reg, password_entry_reg, password_confirm_entry_reg
-    global user_list # user_list загружается здесь и используется глобально
+    global tk, messagebox, load_status_label
+
+    # --- Загрузка пользователей в фоне: начинаем сразу, параллельно с построением окна ---
+    threading.Thread(target=load_users_in_background, daemon=True).start()
+
+    import tkinter as tk # Модуль для создания графического интерфейса пользователя (GUI)
+    from tkinter import messagebox # Модуль для отображения стандартных диалоговых окон (сообщения, ошибки)
 
     # --- Создание главного окна ---
     window = tk.Tk()
@@ -291,6 +250,10 @@ def main():
     go_to_register_button = tk.Button(login_frame, text="Зарегистрироваться", command=lambda: show_frame(register_frame), width=20, font=("Arial", 10))
     go_to_register_button.pack(pady=5)
 
+    # Строка состояния фоновой загрузки пользователей
+    load_status_label = tk.Label(login_frame, text="Загрузка пользователей...", font=("Arial", 9), fg="gray")
+    load_status_label.pack(pady=5)
+
     # --- Виджеты для экрана регистрации (register_frame) ---
     # Используем grid - менеджер геометрии, который размещает виджеты в виде таблицы (строки и столбцы)
     register_label_reg = tk.Label(register_frame, text="Регистрация", font=("Arial", 16, "bold"))
@@ -373,11 +336,11 @@ def main():
     logout_button = tk.Button(user_info_frame, text="Выйти", command=handle_logout, width=15, height=2, font=("Arial", 12))
     logout_button.pack(pady=20)
 
-    # --- Загрузка пользователей и запуск главного цикла приложения ---
-    user_list = load_users(FILENAME) # Загружаем пользователей из файла
-    print(f"Загружено {len(user_list)} пользователей из файла '{FILENAME}'.") # Информационное сообщение в консоль
-
-    show_frame(login_frame) # Показываем начальный экран (вход)
+    # --- Запуск главного цикла приложения ---
+    show_frame(login_frame) # Показываем начальный экран (вход), не дожидаясь загрузки пользователей
+    # Когда окно впервые отрисовано, печатаем время холодного старта
+    window.after_idle(lambda: print(f"Окно показано через {time.perf_counter() - STARTED_AT:.3f} с после запуска."))
+    window.after(100, update_load_status)
     window.mainloop() # Запускаем главный цикл обработки событий Tkinter
 
 # --- Точка входа в программу ---
@@ -0,0 +1,208 @@
+"""
+Необязательная инструментация горячих путей: счетчики, гистограммы задержек,
+профилирование и выгрузка метрик в текстовом формате Prometheus.
+
+Включается переменными окружения (по умолчанию все выключено):
+    KURSACH_METRICS=1              - собирать метрики;
+    KURSACH_METRICS_FILE=путь      - записать метрики в файл при завершении программы;
+    KURSACH_METRICS_PORT=9100      - отдавать метрики по HTTP (http://127.0.0.1:9100/metrics);
+    KURSACH_PROFILE=cprofile       - профилировать программу через cProfile,
+    KURSACH_PROFILE=tracemalloc    - или отслеживать выделения памяти через tracemalloc;
+    KURSACH_PROFILE_FILE=путь      - куда сохранить результат профилирования.
+
+Если метрики выключены, декоратор timed возвращает функцию без изменений,
+а timer - общий пустой контекстный менеджер, так что накладных расходов нет.
+"""
+import atexit
+import contextlib
+import functools
+import os
+import threading
+import time
+
+ENABLED = os.environ.get("KURSACH_METRICS", "") not in ("", "0")
+PREFIX = "kursach_" # Префикс имен всех метрик
+
+# Границы корзин гистограммы задержек, в секундах
+BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+_lock = threading.Lock()
+_counters = {}   # имя -> значение
+_gauges = {}     # имя -> значение
+_histograms = {} # имя -> Histogram
+
+
+class Histogram:
+    """Гистограмма задержек с фиксированными корзинами (как в Prometheus)."""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS) # Количество наблюдений в каждой корзине (не накопительно)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[index] += 1
+                break
+        self.total += seconds
+        self.count += 1
+
+
+def observe(name, seconds):
+    """Добавляет наблюдение длительности в гистограмму 'name'."""
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+
+def increment(name, value=1):
+    """Увеличивает счетчик 'name'."""
+    if ENABLED:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name, value):
+    """Устанавливает текущее значение показателя 'name'."""
+    if ENABLED:
+        with _lock:
+            _gauges[name] = value
+
+
+def timed(name):
+    """
+    Декоратор: замеряет время каждого вызова функции и считает ошибки.
+    При выключенных метриках возвращает исходную функцию.
+    """
+    def decorator(function):
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                increment(f"{name}_errors_total")
+                raise
+            finally:
+                observe(name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def _timer(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+_NO_TIMER = contextlib.nullcontext()
+
+
+def timer(name):
+    """Контекстный менеджер для замера участка кода: with timer("имя"): ..."""
+    return _timer(name) if ENABLED else _NO_TIMER
+
+
+def percentile(sorted_values, fraction):
+    """Перцентиль (0..1) отсортированного списка методом ближайшего ранга."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def render_prometheus():
+    """Возвращает все метрики в текстовом формате Prometheus."""
+    lines = []
+    with _lock:
+        for name, value in sorted(_counters.items()):
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            lines.append(f"{PREFIX}{name} {value}")
+        for name, value in sorted(_gauges.items()):
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            lines.append(f"{PREFIX}{name} {value}")
+        for name, histogram in sorted(_histograms.items()):
+            metric = f"{PREFIX}{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f"{metric}_sum {histogram.total}")
+            lines.append(f"{metric}_count {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+def dump_metrics(filename):
+    """Записывает метрики в файл (атомарно, через временный файл)."""
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, 'w', encoding='utf-8') as file:
+        file.write(render_prometheus())
+    os.replace(temp_filename, filename)
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Запускает в фоновом потоке HTTP-сервер, отдающий метрики по адресу /metrics."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            found = self.path == "/metrics"
+            body = render_prometheus().encode("utf-8") if found else b"" # Метрики - только по /metrics
+            self.send_response(200 if found else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass # Не засоряем консоль запросами к метрикам
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _start_profiling(mode, filename):
+    """Включает профилирование и регистрирует сохранение результата при выходе."""
+    if mode == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def save():
+            profiler.disable()
+            profiler.dump_stats(filename) # Просмотр: python -m pstats файл
+        atexit.register(save)
+    elif mode == "tracemalloc":
+        import tracemalloc
+        tracemalloc.start()
+
+        def save():
+            snapshot = tracemalloc.take_snapshot()
+            with open(filename, 'w', encoding='utf-8') as file:
+                for statistic in snapshot.statistics("lineno")[:50]:
+                    file.write(f"{statistic}\n")
+        atexit.register(save)
+
+
+# --- Настройка по переменным окружения при первом импорте ---
+if ENABLED:
+    if os.environ.get("KURSACH_METRICS_FILE"):
+        atexit.register(dump_metrics, os.environ["KURSACH_METRICS_FILE"])
+    if os.environ.get("KURSACH_METRICS_PORT"):
+        start_http_server(int(os.environ["KURSACH_METRICS_PORT"]))
+
+_profile_mode = os.environ.get("KURSACH_PROFILE", "")
+if _profile_mode:
+    _start_profiling(_profile_mode, os.environ.get("KURSACH_PROFILE_FILE", f"profile_{_profile_mode}.out"))
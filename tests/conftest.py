@@ -0,0 +1,5 @@
+"""Общие настройки тестов: модули программы лежат в корне репозитория."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
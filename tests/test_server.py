@@ -0,0 +1,44 @@
+"""Протокол сервера: ошибки запроса не закрывают соединение."""
+import asyncio
+import json
+
+from auth_server import MAX_LINE, AuthServer
+from auth_service import AuthService
+
+
+async def _exchange(filename, lines):
+    service = AuthService(filename)
+    service.load()
+    server = AuthServer(service)
+    await server.start("127.0.0.1", 0)
+    port = server._server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    responses = []
+    try:
+        for line in lines:
+            writer.write(line + b"\n")
+            await writer.drain()
+            responses.append(json.loads(await reader.readline()))
+    finally:
+        writer.close()
+        await writer.wait_closed()
+        await server.stop()
+    return responses
+
+
+def test_bad_requests_keep_connection(tmp_path):
+    register = {"op": "register", "last_name": "Иванов", "first_name": "Иван", "middle_name": "",
+                "birth_date": "01.01.2000", "gender": "Мужской", "city": "Москва", "email": "ivan@mail.ru",
+                "login": "ivan", "password": "pw", "password_confirm": "pw"}
+    responses = asyncio.run(_exchange(str(tmp_path / "users.data"), [
+        b'{"op": "login", "pad": "' + b"x" * (2 * MAX_LINE) + b'"}',
+        b"not json",
+        b'["list"]',
+        json.dumps(register).encode("utf-8"),
+        b'{"op": "login", "login": "ivan", "password": "pw"}',
+        json.dumps({"op": "search", "city": "Москва"}).encode("utf-8"),
+    ]))
+    assert [response.get("error") for response in responses[:3]] == ["BadRequest"] * 3
+    assert responses[3] == {"ok": True, "login": "ivan"}
+    assert responses[4]["ok"] and responses[4]["token"]
+    assert responses[5]["total"] == 1
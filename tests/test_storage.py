@@ -0,0 +1,117 @@
+"""Двоичный снимок пользователей, отслеживание изменений файла и чтение через CsvBackend."""
+import os
+
+import pytest
+
+from auth_service import AuthService, LoginTakenError
+from user_backends import CsvBackend
+from user_data import FileSnapshot, append_users, save_users, xor_cipher
+from user_record import User
+from users_binary import BinaryUserFile, binary_to_csv, csv_to_binary, write_binary
+
+
+def make_user(login, email=None, city="Москва"):
+    return User("Иванов", "Иван", "", "01.01.2000", "Мужской", city,
+                email if email is not None else f"{login}@mail.ru", login, xor_cipher("пароль", "SimpleKey"))
+
+
+def register(service, login):
+    service.register("Иванов", "Иван", "", "01.01.2000", "Мужской", "Москва",
+                     f"{login}@mail.ru", login, "pw", "pw")
+
+
+def test_binary_round_trip(tmp_path):
+    users = [make_user("zed"), make_user("анна", "Anna@Mail.RU"), make_user("bob", ""), make_user("zed", "dup@mail.ru")]
+    filename = str(tmp_path / "users.bin")
+    write_binary(users, filename)
+    with BinaryUserFile(filename) as binary_file:
+        assert len(binary_file) == 3 # Повторный логин не записывается
+        assert [dict(user_data) for user_data in binary_file] == [dict(user_data) for user_data in users[:3]]
+        assert list(binary_file.logins()) == sorted(["zed", "анна", "bob"], key=lambda login: login.encode())
+        assert dict(binary_file.find_by_login("анна")) == dict(users[1])
+        assert binary_file.find_by_login("dup") is None
+        assert binary_file.find_by_email(" anna@mail.ru ")["login"] == "анна" # Без учета регистра и пробелов
+        assert binary_file.find_by_email("dup@mail.ru") is None
+        assert "bob" in binary_file and "alice" not in binary_file
+
+
+def test_binary_file_rejects_other_files(tmp_path):
+    filename = tmp_path / "users.data"
+    filename.write_bytes(b"not a snapshot" * 10)
+    with pytest.raises(ValueError):
+        BinaryUserFile(str(filename))
+
+
+def test_file_snapshot_grown(tmp_path):
+    filename = str(tmp_path / "users.data")
+    save_users([make_user("a")], filename)
+    snapshot = FileSnapshot(filename)
+    assert snapshot.status() == 'same'
+    append_users([make_user("b")], filename)
+    assert snapshot.status() == 'grown'
+    snapshot.close()
+
+
+def test_file_snapshot_replaced(tmp_path):
+    filename = str(tmp_path / "users.data")
+    save_users([make_user("a"), make_user("b")], filename)
+    snapshot = FileSnapshot(filename)
+    save_users([make_user("a"), make_user("b"), make_user("c")], filename) # Атомарная замена, файл больше
+    assert snapshot.status() == 'replaced'
+    snapshot.close()
+
+    snapshot = FileSnapshot(filename)
+    with open(filename, "r+", encoding="utf-8") as file:
+        file.truncate(10) # Тот же файл стал меньше
+    assert snapshot.status() == 'replaced'
+    os.remove(filename)
+    assert snapshot.status() == 'replaced'
+    snapshot.close()
+
+
+def test_file_snapshot_missing_file(tmp_path):
+    filename = str(tmp_path / "users.data")
+    snapshot = FileSnapshot(filename)
+    assert snapshot.status() == 'same'
+    save_users([make_user("a")], filename)
+    assert snapshot.status() == 'replaced' # Появление файла тоже считается заменой
+
+
+def test_backend_reads_through_snapshot(tmp_path):
+    filename = str(tmp_path / "users.data")
+    running = AuthService(filename)
+    running.load()
+    for login in ("a", "b"):
+        register(running, login)
+    csv_to_binary(filename, str(tmp_path / "users.bin"), reset_journal=True)
+    assert os.path.getsize(filename) == 0
+
+    service = AuthService(filename)
+    assert service.load() == 2
+    assert service.authenticate("a", "pw")["login"] == "a"
+    with pytest.raises(LoginTakenError):
+        register(service, "b")
+    register(service, "c")
+
+    # Уже запущенный сервис видит и снимок, и новую регистрацию
+    assert running.authenticate("c", "pw")["login"] == "c"
+    assert running.authenticate("b", "pw")["login"] == "b"
+    assert running.search_users(city="Москва")[1] == 3
+
+    with CsvBackend(filename) as backend:
+        assert sorted(user_data["login"] for user_data in backend) == ["a", "b", "c"]
+        assert len(backend) == 3
+        assert backend.find_by_login("a")["login"] == "a"
+
+    assert binary_to_csv(str(tmp_path / "users.bin"), filename) == 3
+    assert not os.path.exists(tmp_path / "users.bin")
+    assert AuthService(filename).load() == 3
+
+
+def test_csv_to_binary_keeps_journal_by_default(tmp_path):
+    filename = str(tmp_path / "users.data")
+    save_users([make_user("a")], filename)
+    assert csv_to_binary(filename, str(tmp_path / "users.bin")) == 1
+    assert os.path.getsize(filename) > 0
+    with CsvBackend(filename) as backend:
+        assert len(backend) == 1 # Запись и в снимке, и в журнале считается один раз
@@ -0,0 +1,10 @@
+"""Многопроцессный стресс-тест записи (auth_service.run_stress) в небольшом размере."""
+import pytest
+
+from auth_service import run_stress
+
+
+@pytest.mark.parametrize("shards, sqlite", [(0, False), (3, False), (0, True)], ids=["plain", "sharded", "sqlite"])
+def test_no_registrations_lost(shards, sqlite):
+    expected, found = run_stress(processes=3, users_count=20, compact_every=5, shards=shards, sqlite=sqlite)
+    assert found == expected
@@ -0,0 +1,76 @@
+"""
+Быстрые функции XOR (xor_engine) должны давать тот же результат,
+что и исходные посимвольные реализации.
+"""
+import base64
+import io
+
+import pytest
+
+from user_data import xor_cipher
+from xor_cipher import STREAM_CHUNK_SIZE, xor_base64_cipher, xor_base64_stream
+
+KEYS = ["SimpleKey", "к", "ключ🔑"]
+TEXTS = [
+    "",
+    "a",
+    "ghfhjkm123",
+    "Пароль; с разделителем и кириллицей",
+    "эмодзи 🙂 и суррогаты",
+    "x" * 1000 + "я" * 333,
+]
+CHUNK_SIZES = [1, 2, 3, 4, 5, 7, 12, 100, STREAM_CHUNK_SIZE]
+
+
+def baseline_xor_cipher(text, key):
+    """Исходный xor_cipher из kursach_02.py: XOR кодов символов по одному."""
+    repeated_key = (key * (len(text) // len(key) + 1))[:len(text)]
+    return "".join(chr(ord(char) ^ ord(key_char)) for char, key_char in zip(text, repeated_key))
+
+
+def baseline_xor_base64(text, key, action):
+    """Исходный xor_base64_cipher: XOR байтов UTF-8 по одному, затем Base64."""
+    key_bytes = key.encode("utf-8")
+
+    def xor(data):
+        return bytes(byte ^ key_bytes[i % len(key_bytes)] for i, byte in enumerate(data))
+    if action == "encode":
+        return base64.b64encode(xor(text.encode("utf-8"))).decode("utf-8")
+    return xor(base64.b64decode(text.encode("utf-8"))).decode("utf-8")
+
+
+@pytest.mark.parametrize("key", KEYS)
+@pytest.mark.parametrize("text", TEXTS)
+def test_xor_cipher_matches_baseline(text, key):
+    encoded = xor_cipher(text, key)
+    assert encoded == baseline_xor_cipher(text, key)
+    assert xor_cipher(encoded, key) == text
+
+
+@pytest.mark.parametrize("key", KEYS)
+@pytest.mark.parametrize("text", TEXTS)
+def test_xor_base64_cipher_matches_baseline(text, key):
+    encoded = xor_base64_cipher(text, key, "encode")
+    assert encoded == baseline_xor_base64(text, key, "encode")
+    assert xor_base64_cipher(encoded, key, "decode") == baseline_xor_base64(encoded, key, "decode") == text
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("key", KEYS)
+def test_xor_base64_stream_matches_cipher(key, chunk_size):
+    text = "".join(TEXTS)
+    encoded = io.BytesIO()
+    processed = xor_base64_stream(io.BytesIO(text.encode("utf-8")), encoded, key, "encode", chunk_size)
+    assert processed == len(text.encode("utf-8"))
+    assert encoded.getvalue().decode("ascii") == baseline_xor_base64(text, key, "encode")
+
+    # Переводы строк во входе Base64 пропускаются, как и в b64decode
+    wrapped = b"\n".join(encoded.getvalue()[i:i + 76] for i in range(0, len(encoded.getvalue()), 76))
+    decoded = io.BytesIO()
+    xor_base64_stream(io.BytesIO(wrapped), decoded, key, "decode", chunk_size)
+    assert decoded.getvalue().decode("utf-8") == text
+
+
+def test_xor_base64_stream_rejects_unknown_action():
+    with pytest.raises(ValueError):
+        xor_base64_stream(io.BytesIO(b""), io.BytesIO(), "key", "shuffle")
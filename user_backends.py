@@ -0,0 +1,384 @@
+"""
+Хранилища пользователей на диске (бэкенды) с общим интерфейсом.
+
+Каждый бэкенд умеет:
+    load()                - загрузить всех пользователей списком;
+    changes()             - изменения с прошлого load()/changes(): (новые записи, False)
+                            или (все записи, True), если хранилище заменено целиком;
+    find_by_login(login)  - найти одного пользователя, не загружая остальных;
+    find_by_email(email)  - то же по email (без учета регистра);
+    append(user)          - записать пользователя, уже проверенного внутри transaction();
+    insert(user)          - добавить пользователя (DuplicateUserError, если логин занят);
+    insert_many(users)    - пакетная вставка, дубликаты логинов пропускаются;
+    compact(users)        - уплотнить журнал хранилища;
+    transaction()         - блокировка записи (exclusive=False - только чтения);
+    iter(backend)         - перебрать пользователей в порядке регистрации;
+    len(backend), login in backend, close(), with backend: ...
+Интерфейс поиска совпадает с BinaryUserFile, поэтому любой бэкенд можно подключить
+к UserStore как базовый источник (store.base). AuthService работает только через
+этот интерфейс: lazy=False - пользователи загружаются в память (CSV),
+lazy=True - остаются в хранилище и ищутся в нем (SQLite).
+
+CsvBackend - прежний файл users.data (в том числе разбитый на сегменты),
+используется по умолчанию. Если рядом с ним есть двоичный снимок users.bin
+(users_binary.py), бэкенд подключает его: поиск, перебор и подсчет идут по
+снимку и файлу вместе. SqliteBackend (user_sqlite.py) - база SQLite:
+журнал WAL, уникальный индекс по логину, индекс по email, пакетные транзакции.
+
+    python user_backends.py migrate users.data users.db   - перенести пользователей
+    python user_backends.py count users.db
+    python user_backends.py get users.db ЛОГИН
+"""
+import abc
+import argparse
+import os
+
+from user_data import (FILENAME, load_users, iter_users, append_users, compact_users, read_users_from,
+                       FileSnapshot, file_lock, is_sqlite_file)
+from user_record import FIELDS, email_key
+from user_shards import (load_sharded, manifest_path, owning_shard, read_manifest, save_shards, save_sharded,
+                         shard_files)
+from users_binary import BinaryUserFile, snapshot_path
+
+BATCH_SIZE = 1000 # Записей в одной транзакции пакетной вставки
+
+
+class DuplicateUserError(ValueError):
+    """Пользователь с таким логином уже есть в хранилище."""
+
+
+class StorageBackend(abc.ABC):
+    """Общий интерфейс хранилищ пользователей."""
+
+    lazy = False # True - пользователи не загружаются в память, поиск идет в самом хранилище
+    snapshot = None # Двоичный снимок (users_binary.BinaryUserFile), записи которого load() не возвращает
+
+    @abc.abstractmethod
+    def load(self):
+        """Загружает всех пользователей списком и запоминает состояние хранилища для changes()."""
+
+    @abc.abstractmethod
+    def changes(self):
+        """
+        Изменения, сделанные другими процессами с прошлого load() или changes().
+        Возвращает (новые пользователи, False) или (все пользователи, True),
+        если хранилище заменено и его нужно перечитать целиком.
+        """
+
+    @abc.abstractmethod
+    def find_by_login(self, login):
+        """Пользователь с логином 'login' или None."""
+
+    @abc.abstractmethod
+    def find_by_email(self, email):
+        """Первый пользователь с таким email (без учета регистра) или None."""
+
+    @abc.abstractmethod
+    def append(self, user_data):
+        """Записывает пользователя. Уникальность уже проверена вызывающим внутри transaction()."""
+
+    @abc.abstractmethod
+    def insert_many(self, users):
+        """Пакетная вставка, пользователи с занятым логином пропускаются. Возвращает число добавленных."""
+
+    @abc.abstractmethod
+    def compact(self, users, everything=False):
+        """
+        Уплотняет журнал хранилища. 'users' - все пользователи (для хранилищ,
+        которые переписываются из памяти); everything=True - переписать все целиком.
+        """
+
+    @abc.abstractmethod
+    def transaction(self, exclusive=True):
+        """
+        Контекстный менеджер блокировки: проверки и записи внутри выполняются без
+        вмешательства других процессов. exclusive=False - блокировка только для чтения.
+        """
+
+    @abc.abstractmethod
+    def __iter__(self):
+        """Перебирает пользователей в порядке регистрации."""
+
+    def insert(self, user_data):
+        """Добавляет пользователя; DuplicateUserError, если логин уже занят."""
+        with self.transaction():
+            if user_data["login"] in self:
+                raise DuplicateUserError(f"Пользователь с логином '{user_data['login']}' уже существует.")
+            self.append(user_data)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, login):
+        return self.find_by_login(login) is not None
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CsvBackend(StorageBackend):
+    """
+    Файл users.data в формате CSV (или его сегменты, см. user_shards.py) - журнал
+    дозаписей с периодическим уплотнением. Поиск без загрузки - последовательный
+    просмотр файла до первого совпадения.
+
+    После load() бэкенд помнит прочитанные файлы (FileSnapshot), поэтому changes()
+    читает только дописанные другими процессами хвосты, а compact() переписывает
+    только сегменты, изменившиеся с прошлого уплотнения.
+    load, changes, append и compact вызываются под transaction().
+
+    Двоичный снимок (self.snapshot) не загружается: load() и changes() возвращают
+    только записи CSV (журнал после снимка), а снимок подключается к UserStore
+    как базовый источник. Перебор, подсчет и поиск учитывают оба файла; при
+    совпадении логина побеждает запись снимка, как и в users_binary.binary_to_csv.
+    """
+
+    def __init__(self, filename=FILENAME):
+        self.filename = filename
+        self._manifest = None # Манифест сегментов на момент load() (None - обычный файл)
+        self._snapshots = {} # Файлы на момент последнего чтения: путь -> FileSnapshot
+        self._changed_files = set() # Файлы (сегменты), дописанные с момента последнего уплотнения
+        self.snapshot = None # Двоичный снимок рядом с файлом (или None)
+
+    def _current_manifest(self):
+        # После load() изменение манифеста обнаруживает changes(); до него читаем манифест с диска
+        return self._manifest if self._snapshots else read_manifest(self.filename)
+
+    def _paths(self, manifest):
+        return shard_files(self.filename, manifest) if manifest is not None else [self.filename]
+
+    def _attach_snapshot(self):
+        """Подключает двоичный снимок, если он есть на диске; заменен - открывает новый, удален - отключает."""
+        path = snapshot_path(self.filename)
+        if not os.path.exists(path):
+            self.snapshot = None # to-csv вернул записи снимка в CSV-файл
+        elif self.snapshot is None:
+            self.snapshot = BinaryUserFile(path)
+        else:
+            # Старое отображение не закрываем: его еще могут читать другие потоки через UserStore
+            self.snapshot = self.snapshot.reopened()
+        return self.snapshot
+
+    def _current_snapshot(self):
+        # После load() замену снимка обнаруживает changes(); до него смотрим на диск
+        return self.snapshot if self._snapshots else self._attach_snapshot()
+
+    def load(self):
+        """Читает всех пользователей из файла или из его сегментов и запоминает все файлы, включая манифест."""
+        self._manifest = read_manifest(self.filename)
+        if self._manifest is None:
+            users = load_users(self.filename)
+        else:
+            users = load_sharded(self.filename, manifest=self._manifest) # Сегменты читаются параллельно
+        paths = self._paths(self._manifest)
+        paths.append(manifest_path(self.filename)) # Разбиение или сборка файла другим процессом
+        paths.append(snapshot_path(self.filename)) # Создание, замена или удаление снимка
+        self._attach_snapshot()
+        for snapshot in self._snapshots.values():
+            snapshot.close()
+        self._snapshots = {}
+        self._changed_files.clear() # Пути сегментов могли измениться (смена разбиения)
+        self._remember(paths)
+        return users
+
+    def _remember(self, paths):
+        """Запоминает текущее состояние файлов (после чтения или своей записи под блокировкой)."""
+        for path in paths:
+            previous = self._snapshots.get(path)
+            if previous is not None:
+                previous.close()
+            self._snapshots[path] = FileSnapshot(path)
+
+    def changes(self):
+        grown = []
+        for path, snapshot in self._snapshots.items():
+            status = snapshot.status()
+            if status == 'same':
+                continue # Файл не менялся - ничего не читаем
+            if status == 'replaced' or path in (manifest_path(self.filename), snapshot_path(self.filename)):
+                # Файл заменен (уплотнение или смена разбиения в другом процессе) - перечитываем целиком
+                return self.load(), True
+            grown.append(snapshot)
+
+        users = []
+        for snapshot in grown:
+            # Тот же файл, который только вырос: читаем только дописанный хвост
+            new_users, snapshot.size = read_users_from(snapshot.filename, snapshot.size)
+            self._changed_files.add(snapshot.filename) # В дописанном хвосте могут быть оборванные строки
+            users.extend(new_users)
+        return users, False
+
+    def __iter__(self):
+        snapshot = self._current_snapshot()
+        if snapshot is not None:
+            yield from snapshot
+        for path in self._paths(self._current_manifest()):
+            for user_data in iter_users(path):
+                if snapshot is None or user_data["login"] not in snapshot:
+                    yield user_data
+
+    def __len__(self):
+        snapshot = self._current_snapshot()
+        journal = sum(1 for path in self._paths(self._current_manifest())
+                      for user_data in iter_users(path, fields=("login",))
+                      if snapshot is None or user_data["login"] not in snapshot)
+        return journal + (len(snapshot) if snapshot is not None else 0)
+
+    def find_by_login(self, login):
+        snapshot = self._current_snapshot()
+        if snapshot is not None:
+            user_data = snapshot.find_by_login(login)
+            if user_data is not None:
+                return user_data
+        for path in self._paths(self._current_manifest()):
+            for user_data in iter_users(path):
+                if user_data["login"] == login:
+                    return user_data # Как и find_user_by_login: первая запись с логином
+        return None
+
+    def find_by_email(self, email):
+        snapshot = self._current_snapshot()
+        if snapshot is not None:
+            user_data = snapshot.find_by_email(email)
+            if user_data is not None:
+                return user_data
+        key = email_key(email)
+        for path in self._paths(self._current_manifest()):
+            for user_data in iter_users(path):
+                if email_key(user_data["email"]) == key:
+                    return user_data
+        return None
+
+    def transaction(self, exclusive=True):
+        return file_lock(self.filename, exclusive)
+
+    def append(self, user_data):
+        self._append([user_data])
+
+    def _append(self, users):
+        """Дописывает пользователей в файл или, для разбитого файла, в сегменты их логинов."""
+        manifest = self._current_manifest()
+        groups = {}
+        for user_data in users:
+            path = self.filename if manifest is None else owning_shard(self.filename, user_data["login"], manifest)
+            groups.setdefault(path, []).append(user_data)
+        for path, group in groups.items():
+            append_users(group, path) # Одна запись и один fsync на файл
+            self._changed_files.add(path)
+            if self._snapshots:
+                self._remember([path]) # Свою запись перечитывать не нужно
+
+    def insert_many(self, users, batch_size=BATCH_SIZE):
+        """Пакетная вставка: один fsync на 'batch_size' записей. Возвращает число добавленных."""
+        inserted = 0
+        with self.transaction():
+            logins = {user_data["login"] for path in self._paths(self._current_manifest())
+                      for user_data in iter_users(path, fields=("login",))}
+            snapshot = self._current_snapshot()
+            if snapshot is not None:
+                logins.update(snapshot.logins()) # Логины снимка тоже заняты
+            batch = []
+            for user_data in users:
+                if user_data["login"] in logins:
+                    continue
+                logins.add(user_data["login"])
+                batch.append(user_data)
+                if len(batch) >= batch_size:
+                    self._append(batch)
+                    inserted += len(batch)
+                    batch = []
+            if batch:
+                self._append(batch)
+                inserted += len(batch)
+        return inserted
+
+    def compact(self, users, everything=False):
+        """
+        Атомарно переписывает файл из списка 'users' (в нем должны быть все записи файла).
+        Для разбитого файла переписываются только сегменты, изменившиеся с прошлого
+        уплотнения (дописанные этим или другими процессами), или все при everything=True.
+        """
+        manifest = self._current_manifest()
+        if manifest is None:
+            compact_users(users, self.filename)
+        elif everything:
+            save_sharded(users, self.filename, manifest["count"])
+        elif self._changed_files:
+            save_shards(users, self.filename, sorted(self._changed_files), manifest)
+        self._changed_files.clear()
+        if self._snapshots:
+            self._remember(list(self._snapshots))
+
+    def close(self):
+        for snapshot in self._snapshots.values():
+            snapshot.close()
+        self._snapshots = {}
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+
+
+def open_backend(filename):
+    """Открывает хранилище по имени файла: .db/.sqlite/.sqlite3 - SQLite, иначе CSV."""
+    if is_sqlite_file(filename):
+        from user_sqlite import SqliteBackend # sqlite3 импортируется только при необходимости
+        return SqliteBackend(filename)
+    return CsvBackend(filename)
+
+
+def migrate(source_filename, target_filename):
+    """
+    Переносит пользователей из одного хранилища в другое (в любую сторону)
+    потоково, пакетами. Логины, уже существующие в целевом хранилище, пропускаются.
+    Возвращает кортеж (прочитано, добавлено).
+    """
+    with open_backend(source_filename) as source, open_backend(target_filename) as target:
+        read = 0
+
+        def counted():
+            nonlocal read
+            for user_data in source:
+                read += 1
+                yield user_data
+        inserted = target.insert_many(counted())
+    return read, inserted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Хранилища пользователей: перенос и проверка.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = commands.add_parser('migrate', help="Перенести пользователей между хранилищами")
+    migrate_parser.add_argument('source', help="Откуда (users.data или users.db)")
+    migrate_parser.add_argument('target', help="Куда (users.db или users.data)")
+    count_parser = commands.add_parser('count', help="Количество пользователей")
+    count_parser.add_argument('file')
+    get_parser = commands.add_parser('get', help="Найти пользователя по логину")
+    get_parser.add_argument('file')
+    get_parser.add_argument('login')
+    args = parser.parse_args(argv)
+
+    if args.command == 'migrate':
+        read, inserted = migrate(args.source, args.target)
+        print(f"Прочитано {read}, добавлено {inserted} пользователей: '{args.source}' -> '{args.target}'.")
+    elif args.command == 'count':
+        with open_backend(args.file) as backend:
+            print(len(backend))
+    else:
+        with open_backend(args.file) as backend:
+            user_data = backend.find_by_login(args.login)
+        if user_data is None:
+            print("Пользователь не найден.")
+            return 1
+        for field in FIELDS[:-1]: # Без пароля
+            print(f"{field}: {user_data[field]}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
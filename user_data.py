@@ -0,0 +1,308 @@
+"""
+Работа с данными пользователей: XOR-кодирование паролей и файл users.data.
+Модуль не зависит от tkinter и используется как графическим интерфейсом
+(kursach_02.py), так и сервисом аутентификации (auth_service.py).
+"""
+import contextlib # Модуль для создания контекстного менеджера блокировки
+import csv # Модуль для работы с CSV файлами (хранение данных пользователей)
+import io # Модуль для формирования CSV-строки в памяти перед дозаписью в файл
+import os # Модуль для низкоуровневой работы с файлами (дозапись, fsync, атомарная замена)
+from user_store import UserStore # Хранилище пользователей с хеш-индексами по логину и email
+from metrics import timed # Необязательный замер времени (включается переменной KURSACH_METRICS)
+from xor_engine import xor_text # Быстрый XOR целой строкой вместо посимвольного цикла
+from user_record import FIELDS, User # Порядок полей и компактная запись пользователя (__slots__)
+
+try:
+    import fcntl # Рекомендательные блокировки файлов (есть только в Unix)
+except ImportError:
+    fcntl = None
+
+# --- Константы ---
+FILENAME = "users.data" # Имя файла для хранения данных пользователей. Файл будет в папке запуска скрипта.
+XOR_KEY = "SimpleKey"   # Простой ключ для XOR "шифрования". В реальных системах использовать нельзя!
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3") # Файлы с такими расширениями - база SQLite (см. user_backends.py)
+
+# --- Функции для работы с данными ---
+
+@timed("xor_cipher")
+def xor_cipher(text, key):
+  """
+  Кодирует или декодирует текст с помощью битовой операции XOR.
+  Принимает строку 'text' и строку 'key'.
+  Возвращает строку, являющуюся результатом операции XOR.
+  Внимание: результат может содержать непечатные символы,
+  так как операция XOR применяется к кодам символов.
+  """
+  # Если ключ короче текста, он будет циклически повторяться.
+  # Операция XOR применяется к кодам Unicode каждого символа текста и ключа,
+  # но не посимвольно, а сразу ко всей строке (см. xor_engine.xor_text).
+  return xor_text(text, key)
+
+@timed("load_users")
+def load_users(filename):
+  """
+  Загружает список пользователей из указанного файла.
+  Если файл не существует, он будет создан при первой попытке записи (режим 'a+').
+  Если файл разбит на сегменты (есть манифест, см. user_shards.py), загружаются сегменты.
+  """
+  from user_shards import load_sharded, manifest_path # Импорт здесь: user_shards сам импортирует этот модуль
+  if os.path.exists(manifest_path(filename)):
+      return load_sharded(filename)
+  # Открываем файл в режиме 'a+' (добавление и чтение), чтобы создать его, если он не существует.
+  with open(filename, 'a+', newline='', encoding='utf-8'):
+      pass
+  # Сами записи читает генератор iter_users - здесь они собираются в список
+  return list(iter_users(filename))
+
+
+def iter_users(filename, fields=None, on_error='skip'):
+  """
+  Ленивое чтение пользователей из файла: записи выдаются по одной,
+  файл не загружается в память целиком. Чтение можно прервать в любой момент
+  (например, на первом совпадении) - файл при этом закрывается.
+
+  :param filename: Файл пользователей. Если его нет, не выдается ничего.
+  :param fields: None - выдавать полные записи User; иначе последовательность
+                 имен полей - выдаются словари только с этими полями.
+  :param on_error: Что делать со строкой, в которой не 9 полей:
+                   'skip' - пропустить (как load_users), 'raise' - бросить ValueError,
+                   функция f(номер_строки, строка) - сообщить о ней и продолжить.
+  """
+  if fields is not None:
+      unknown = [name for name in fields if name not in FIELDS]
+      if unknown:
+          raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+      projection = [(name, FIELDS.index(name)) for name in fields] # Имена и номера нужных столбцов
+  try:
+      # newline='' и encoding='utf-8' важны для корректной работы с CSV и кириллицей.
+      file = open(filename, newline='', encoding='utf-8')
+  except FileNotFoundError:
+      return
+  with file:
+      reader = csv.reader(file, delimiter=';') # Создаем объект для чтения CSV, разделитель - точка с запятой.
+      for row in reader: # Читаем файл построчно
+          if not row: # Пустые строки пропускаем всегда
+              continue
+          if len(row) != 9: # Строка должна содержать 9 полей
+              if on_error == 'raise':
+                  raise ValueError(f"{filename}, строка {reader.line_num}: ожидалось 9 полей, получено {len(row)}.")
+              if callable(on_error):
+                  on_error(reader.line_num, row)
+              continue
+          if fields is None:
+              # Поля идут в порядке: фамилия, имя, отчество, дата рождения, пол, город, email, логин
+              # и пароль в "зашифрованном" XOR виде.
+              yield User.from_row(row)
+          else:
+              yield {name: row[index] for name, index in projection}
+
+
+@timed("read_users_from")
+def read_users_from(filename, offset):
+  """
+  Читает пользователей, дописанные в файл начиная с байта 'offset'.
+  Возвращает кортеж (список пользователей, позиция конца прочитанных данных).
+  Нужна, чтобы после чужой дозаписи не разбирать весь файл заново.
+  """
+  with open(filename, 'rb') as file:
+      file.seek(offset)
+      data = file.read()
+  users = []
+  reader = csv.reader(io.StringIO(data.decode('utf-8'), newline=''), delimiter=';')
+  for row in reader:
+      if row and len(row) == 9: # Те же правила, что и в load_users
+          users.append(User.from_row(row))
+  return users, offset + len(data)
+
+
+class FileSnapshot:
+  """
+  Запоминает файл таким, каким он был прочитан: открытый дескриптор и размер.
+  Сравнивать только номер inode нельзя: после os.replace старый inode освобождается,
+  и файловая система (например, ext4) может выдать тот же номер следующей замене.
+  Пока дескриптор открыт, inode занят, поэтому os.path.samestat надежно
+  отличает "тот же файл, который дописали" от "файла, замененного новым".
+  """
+
+  def __init__(self, filename):
+      self.filename = filename
+      try:
+          self.fd = os.open(filename, os.O_RDONLY)
+      except FileNotFoundError:
+          self.fd = None # Файла нет - появление файла тоже считается заменой
+      self.size = os.fstat(self.fd).st_size if self.fd is not None else 0 # Сколько байт уже прочитано
+
+  def status(self):
+      """
+      Проверяет файл без чтения: 'same' - не менялся, 'grown' - тот же файл дописан,
+      'replaced' - файл заменен, удален, появился или уменьшился (нужно перечитать целиком).
+      """
+      try:
+          stat = os.stat(self.filename)
+      except FileNotFoundError:
+          return 'same' if self.fd is None else 'replaced'
+      if self.fd is None or not os.path.samestat(stat, os.fstat(self.fd)):
+          return 'replaced'
+      if stat.st_size == self.size:
+          return 'same'
+      return 'grown' if stat.st_size > self.size else 'replaced'
+
+  def close(self):
+      if self.fd is not None:
+          os.close(self.fd)
+          self.fd = None
+
+  def __del__(self):
+      self.close()
+
+
+@contextlib.contextmanager
+def file_lock(filename, exclusive=True):
+  """
+  Межпроцессная блокировка файла пользователей (fcntl.flock).
+  Блокируется отдельный файл 'filename.lock', так как сам файл данных
+  при уплотнении заменяется новым (os.replace) и меняет inode.
+  exclusive=True - для записи, False - разделяемая блокировка для чтения.
+  В системах без fcntl блокировка не выполняется.
+  """
+  if fcntl is None:
+      yield
+      return
+  with open(filename + ".lock", 'a') as lock:
+      fcntl.flock(lock.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+      try:
+          yield
+      finally:
+          fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def user_to_row(user_data_item):
+  """Преобразует словарь пользователя в список из 9 полей для записи в CSV."""
+  return [
+      user_data_item["last_name"],
+      user_data_item["first_name"],
+      user_data_item["middle_name"],
+      user_data_item["birth_date"],
+      user_data_item["gender"],
+      user_data_item["city"],
+      user_data_item["email"],
+      user_data_item["login"],
+      user_data_item["password_xor_encoded"] # Сохраняем XOR "зашифрованный" пароль
+  ]
+
+
+def _fsync_directory(filename):
+  """Сбрасывает на диск папку файла, чтобы переименование внутри нее пережило сбой питания."""
+  try:
+      fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+  except OSError:
+      return # Папку нельзя открыть как файл (Windows) - там os.replace и так сохраняется журналом ФС
+  try:
+      os.fsync(fd)
+  finally:
+      os.close(fd)
+
+
+@contextlib.contextmanager
+def atomic_write(filename, mode='w', **open_args):
+  """
+  Атомарная замена файла: with atomic_write(имя) as file: file.write(...).
+  Данные пишутся во временный файл рядом с основным (та же файловая система),
+  сбрасываются на диск (fsync), затем временный файл переименовывается поверх
+  старого, и на диск сбрасывается сама папка - иначе после сбоя переименование
+  может пропасть. При ошибке посреди записи старый файл остается нетронутым.
+  'mode' и 'open_args' передаются в open (например, 'wb' или newline='').
+  """
+  temp_filename = filename + ".tmp"
+  try:
+      with open(temp_filename, mode, **open_args) as file:
+          yield file
+          file.flush()
+          os.fsync(file.fileno()) # Убеждаемся, что данные физически записаны на диск
+  except BaseException:
+      with contextlib.suppress(FileNotFoundError):
+          os.remove(temp_filename)
+      raise
+  os.replace(temp_filename, filename) # Атомарная замена старого файла новым
+  _fsync_directory(filename)
+
+
+@timed("save_users")
+def save_users(users, filename):
+  """
+  Сохраняет текущий список пользователей в указанный файл.
+  Файл перезаписывается целиком, но атомарно (atomic_write):
+  при сбое посреди записи старый файл остается нетронутым.
+  """
+  with atomic_write(filename, newline='', encoding='utf-8') as file:
+      writer = csv.writer(file, delimiter=';') # Создаем объект для записи CSV.
+      for user_data_item in users: # Проходим по каждому пользователю в списке
+          # Записываем данные пользователя в файл одной строкой
+          writer.writerow(user_to_row(user_data_item))
+
+
+@timed("append_user")
+def append_user(user_data_item, filename):
+  """
+  Дописывает одного пользователя в конец файла (журнальная запись).
+  Стоимость не зависит от количества пользователей: пишется одна строка,
+  после чего вызывается fsync. Если предыдущая запись была оборвана сбоем
+  (файл не заканчивается переводом строки), новая запись начинается с новой строки.
+  """
+  append_users([user_data_item], filename)
+
+
+def append_users(users, filename):
+  """
+  Дописывает несколько пользователей в конец файла одной записью и одним fsync
+  (пакетная вставка). Правила те же, что и у append_user.
+  """
+  # Формируем CSV-строки в памяти тем же csv.writer, что и save_users
+  buffer = io.StringIO()
+  writer = csv.writer(buffer, delimiter=';')
+  for user_data_item in users:
+      writer.writerow(user_to_row(user_data_item))
+  data = buffer.getvalue().encode('utf-8')
+  if not data:
+      return
+
+  # O_APPEND гарантирует, что запись всегда попадает в конец файла
+  fd = os.open(filename, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+  try:
+      size = os.fstat(fd).st_size
+      if size > 0:
+          os.lseek(fd, size - 1, os.SEEK_SET)
+          if os.read(fd, 1) != b"\n": # Хвост оборванной записи - отделяем его
+              data = b"\n" + data
+      while data: # Большой пакет может записаться не за один вызов
+          data = data[os.write(fd, data):]
+      os.fsync(fd) # Запись считается выполненной только после сброса на диск
+  finally:
+      os.close(fd)
+
+
+def is_sqlite_file(filename):
+  """Проверяет по расширению, что пользователи хранятся в базе SQLite, а не в CSV-файле."""
+  return os.path.splitext(filename)[1].lower() in SQLITE_SUFFIXES
+
+
+def compact_users(users, filename):
+  """
+  Уплотняет журнал: атомарно переписывает файл из списка 'users'.
+  Из файла при этом исчезают оборванные и некорректные строки.
+  """
+  save_users(users, filename)
+
+
+def find_user_by_login(users_list_to_search, login_to_find):
+  """
+  Ищет пользователя в предоставленном списке по логину.
+  Если передано хранилище UserStore, поиск выполняется по хеш-индексу за O(1).
+  Возвращает словарь с данными пользователя, если найден, иначе None.
+  """
+  if isinstance(users_list_to_search, UserStore):
+    return users_list_to_search.find_by_login(login_to_find)
+  for user_data_item in users_list_to_search:
+    if user_data_item["login"] == login_to_find:
+      return user_data_item # Пользователь найден
+  return None # Пользователь не найден
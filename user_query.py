@@ -0,0 +1,240 @@
+"""
+Поиск пользователей по городу, полу, началу ФИО и диапазону дат рождения.
+
+UserQueryIndex строит над загруженными записями несколько индексов:
+  - отсортированный список ФИО (в нижнем регистре) - для поиска по префиксу;
+  - инвертированные индексы город -> пользователи и пол -> пользователи;
+  - отсортированный по дате рождения список (дата в формате ДД.ММ.ГГГГ,
+    как на форме регистрации; записи с некорректной датой в него не попадают).
+Префикс и диапазон дат находятся двоичным поиском, город и пол - по словарю,
+поэтому ответ не требует просмотра всех пользователей. Результаты выдаются
+страницами. Если индекс подписан на UserStore (store.subscribe), новые
+регистрации добавляются в него сразу, без перестроения.
+
+    python user_query.py --city Москва --name Ив --born-from 01.01.1990 --page 1
+"""
+import argparse
+import datetime
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+# Страница результата: записи, номер первой записи, размер страницы и общее количество
+# (total = None, если точное количество не запрашивалось и требует полного перебора)
+Page = namedtuple("Page", ["items", "offset", "limit", "total"])
+
+PAGE_SIZE = 50
+
+
+def parse_birth_date(text):
+    """
+    Переводит дату 'ДД.ММ.ГГГГ' в порядковый номер дня (date.toordinal).
+    Возвращает None для некорректной даты.
+    """
+    try:
+        day, month, year = text.strip().split(".")
+        return datetime.date(int(year), int(month), int(day)).toordinal()
+    except ValueError:
+        return None
+
+
+def _name_key(user_data):
+    """Ключ индекса ФИО: 'фамилия имя отчество' в нижнем регистре."""
+    return " ".join(part for part in (user_data["last_name"], user_data["first_name"], user_data["middle_name"])
+                    if part).casefold()
+
+
+def _value_key(value):
+    return (value or "").strip().casefold()
+
+
+class UserQueryIndex:
+    """Индексы для поиска пользователей. Подключается к хранилищу: store.subscribe(index)."""
+
+    def __init__(self, users=()):
+        self.on_reload(users)
+
+    # --- Обновление индексов (интерфейс подписчика UserStore) ---
+
+    def on_reload(self, users):
+        """Полностью перестраивает индексы по списку пользователей."""
+        self._by_city = {}
+        self._by_gender = {}
+        names = []
+        dates = []
+        for user_data in users:
+            self._add_inverted(user_data)
+            names.append((_name_key(user_data), user_data))
+            birth = parse_birth_date(user_data["birth_date"])
+            if birth is not None:
+                dates.append((birth, user_data))
+        # Сортировка устойчивая: при равных ключах сохраняется порядок регистрации
+        names.sort(key=lambda item: item[0])
+        dates.sort(key=lambda item: item[0])
+        self._name_keys = [key for key, _ in names]
+        self._name_users = [user_data for _, user_data in names]
+        self._date_keys = [key for key, _ in dates]
+        self._date_users = [user_data for _, user_data in dates]
+
+    def on_append(self, user_data):
+        """
+        Добавляет одного пользователя во все индексы. Место находится двоичным поиском
+        за O(log n), но вставка в отсортированный список - O(n): элементы после нее
+        сдвигаются (одним memmove; на миллионе записей - до нескольких миллисекунд).
+        """
+        self._add_inverted(user_data)
+        key = _name_key(user_data)
+        position = bisect_right(self._name_keys, key)
+        self._name_keys.insert(position, key)
+        self._name_users.insert(position, user_data)
+        birth = parse_birth_date(user_data["birth_date"])
+        if birth is not None:
+            position = bisect_right(self._date_keys, birth)
+            self._date_keys.insert(position, birth)
+            self._date_users.insert(position, user_data)
+
+    def _add_inverted(self, user_data):
+        self._by_city.setdefault(_value_key(user_data["city"]), []).append(user_data)
+        self._by_gender.setdefault(_value_key(user_data["gender"]), []).append(user_data)
+
+    # --- Поиск ---
+
+    def _candidates(self, city, gender, name_prefix, born_from, born_to):
+        """
+        Возвращает кандидатов для каждого заданного условия в виде
+        (список, начало, конец): подходящие записи - это список[начало:конец].
+        """
+        sources = []
+        if city is not None:
+            users = self._by_city.get(_value_key(city), [])
+            sources.append((users, 0, len(users)))
+        if gender is not None:
+            users = self._by_gender.get(_value_key(gender), [])
+            sources.append((users, 0, len(users)))
+        if name_prefix is not None:
+            prefix = name_prefix.casefold()
+            low = bisect_left(self._name_keys, prefix)
+            high = bisect_left(self._name_keys, prefix + "\U0010ffff") # Все строки, начинающиеся с prefix
+            sources.append((self._name_users, low, high))
+        if born_from is not None or born_to is not None:
+            low = 0 if born_from is None else bisect_left(self._date_keys, born_from)
+            high = len(self._date_keys) if born_to is None else bisect_right(self._date_keys, born_to)
+            sources.append((self._date_users, low, max(low, high)))
+        return sources
+
+    def query(self, city=None, gender=None, name_prefix=None, born_from=None, born_to=None,
+              offset=0, limit=PAGE_SIZE, count_total=False):
+        """
+        Ищет пользователей, удовлетворяющих всем заданным условиям.
+
+        :param city: Город (без учета регистра).
+        :param gender: Пол (без учета регистра).
+        :param name_prefix: Начало строки 'фамилия имя отчество' (без учета регистра).
+        :param born_from: Дата рождения не раньше ('ДД.ММ.ГГГГ').
+        :param born_to: Дата рождения не позже ('ДД.ММ.ГГГГ').
+        :param offset: Сколько первых результатов пропустить (не меньше 0).
+        :param limit: Размер страницы (больше 0).
+        :param count_total: Подсчитать общее количество, даже если для этого нужен
+                            перебор (для одного условия оно известно сразу).
+        :return: Page. Порядок: по самому избирательному условию (ФИО - по алфавиту,
+                 дата - по возрастанию, город и пол - в порядке регистрации).
+        """
+        if offset < 0:
+            raise ValueError("Смещение страницы не может быть отрицательным.")
+        if limit < 1:
+            raise ValueError("Размер страницы должен быть больше нуля.")
+        born_from = _parse_bound(born_from)
+        born_to = _parse_bound(born_to)
+        sources = self._candidates(city, gender, name_prefix, born_from, born_to)
+        if not sources:
+            raise ValueError("Не задано ни одного условия поиска.")
+
+        # Перебираем самый маленький набор кандидатов, остальные условия проверяем у каждой записи
+        sources.sort(key=lambda source: source[2] - source[1])
+        users, low, high = sources[0]
+
+        if len(sources) == 1:
+            # Одно условие: страница - это просто срез индекса, количество известно сразу
+            items = users[low + offset:min(high, low + offset + limit)]
+            return Page(items, offset, limit, high - low)
+
+        checks = _predicates(city, gender, name_prefix, born_from, born_to)
+        items = []
+        matched = 0
+        for user_data in _slice(users, low, high):
+            if all(check(user_data) for check in checks):
+                if offset <= matched < offset + limit:
+                    items.append(user_data)
+                matched += 1
+                if matched >= offset + limit and not count_total:
+                    break
+        return Page(items, offset, limit, matched if count_total else None)
+
+
+def _slice(sequence, low, high):
+    """Ленивый срез списка (без копирования всего диапазона)."""
+    for index in range(max(0, low), min(high, len(sequence))):
+        yield sequence[index]
+
+
+def _parse_bound(value):
+    """Граница диапазона дат: строка 'ДД.ММ.ГГГГ', date или уже готовый номер дня."""
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, datetime.date):
+        return value.toordinal()
+    ordinal = parse_birth_date(value)
+    if ordinal is None:
+        raise ValueError(f"Некорректная дата '{value}', ожидается ДД.ММ.ГГГГ.")
+    return ordinal
+
+
+def _predicates(city, gender, name_prefix, born_from, born_to):
+    """Проверки условий для одной записи."""
+    checks = []
+    if city is not None:
+        city_key = _value_key(city)
+        checks.append(lambda user_data: _value_key(user_data["city"]) == city_key)
+    if gender is not None:
+        gender_key = _value_key(gender)
+        checks.append(lambda user_data: _value_key(user_data["gender"]) == gender_key)
+    if name_prefix is not None:
+        prefix = name_prefix.casefold()
+        checks.append(lambda user_data: _name_key(user_data).startswith(prefix))
+    if born_from is not None or born_to is not None:
+        def in_range(user_data):
+            birth = parse_birth_date(user_data["birth_date"])
+            return (birth is not None and (born_from is None or birth >= born_from)
+                    and (born_to is None or birth <= born_to))
+        checks.append(in_range)
+    return checks
+
+
+def main(argv=None):
+    from user_backends import open_backend
+    from user_data import FILENAME
+
+    parser = argparse.ArgumentParser(description="Поиск пользователей.")
+    parser.add_argument('--file', default=FILENAME, help="Файл пользователей")
+    parser.add_argument('--city', help="Город")
+    parser.add_argument('--gender', help="Пол")
+    parser.add_argument('--name', help="Начало ФИО")
+    parser.add_argument('--born-from', help="Дата рождения не раньше (ДД.ММ.ГГГГ)")
+    parser.add_argument('--born-to', help="Дата рождения не позже (ДД.ММ.ГГГГ)")
+    parser.add_argument('--page', type=int, default=1, help="Номер страницы (с 1)")
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE, help="Размер страницы")
+    args = parser.parse_args(argv)
+
+    if args.page < 1 or args.page_size < 1:
+        parser.error("Номер и размер страницы должны быть больше нуля.")
+    with open_backend(args.file) as backend:
+        index = UserQueryIndex(backend) # CSV вместе с двоичным снимком или база SQLite
+    page = index.query(args.city, args.gender, args.name, args.born_from, args.born_to,
+                       offset=(args.page - 1) * args.page_size, limit=args.page_size, count_total=True)
+    for user_data in page.items:
+        print(f"{user_data['login']}: {user_data['last_name']} {user_data['first_name']} {user_data['middle_name']}, "
+              f"{user_data['birth_date']}, {user_data['gender']}, {user_data['city']}")
+    print(f"Страница {args.page}, найдено всего: {page.total}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Компактное представление пользователя.
+
+User хранит 9 полей в __slots__ (без словаря __dict__ у каждого объекта),
+а повторяющиеся значения пола и города интернируются: все пользователи
+из одного города ссылаются на одну и ту же строку.
+При этом User ведет себя как словарь: user["login"],
+user.get("city", "N/A"), dict(user) работают как раньше.
+
+UserColumns - еще более компактный столбцовый контейнер: каждое поле
+хранится в отдельном списке, а объект User создается только при обращении.
+
+Запуск модуля напрямую печатает замер памяти на одного пользователя.
+"""
+import sys
+from collections.abc import Mapping
+
+# Порядок полей - тот же, что и в CSV-файле users.data
+FIELDS = ("last_name", "first_name", "middle_name", "birth_date", "gender",
+          "city", "email", "login", "password_xor_encoded")
+
+# Поля с небольшим числом различных значений - их строки интернируются
+INTERNED_FIELDS = ("gender", "city")
+
+
+def email_key(email):
+    """
+    Email в том виде, в котором его сравнивают при проверке дубликатов: без пробелов
+    по краям и без учета регистра (None - пустая строка). Единственное правило
+    для всех хранилищ - UserStore, двоичного снимка, SQLite и пакетного импорта.
+    """
+    return (email or "").strip().lower()
+
+
+class User(Mapping):
+    """Запись пользователя с доступом как к словарю."""
+
+    __slots__ = FIELDS
+
+    def __init__(self, last_name="", first_name="", middle_name="", birth_date="", gender="",
+                 city="", email="", login="", password_xor_encoded=""):
+        self.last_name = last_name
+        self.first_name = first_name
+        self.middle_name = middle_name
+        self.birth_date = birth_date
+        self.gender = sys.intern(gender)
+        self.city = sys.intern(city)
+        self.email = email
+        self.login = login
+        self.password_xor_encoded = password_xor_encoded
+
+    @classmethod
+    def from_row(cls, row):
+        """Создает пользователя из строки CSV (список из 9 полей)."""
+        return cls(*row)
+
+    def to_row(self):
+        """Возвращает список из 9 полей для записи в CSV."""
+        return [getattr(self, field) for field in FIELDS]
+
+    # --- Интерфейс словаря ---
+
+    def __getitem__(self, key):
+        if key not in FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in FIELDS:
+            raise KeyError(key)
+        if key in INTERNED_FIELDS:
+            value = sys.intern(value)
+        setattr(self, key, value)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return f"User(login={self.login!r})"
+
+
+class UserColumns:
+    """
+    Столбцовое хранилище пользователей: по одному списку на каждое поле.
+    Вместо объекта на пользователя хранятся только ссылки на строки в столбцах.
+    """
+
+    def __init__(self, users=()):
+        self.columns = {field: [] for field in FIELDS}
+        for user_data in users:
+            self.append(user_data)
+
+    def append(self, user_data):
+        """Добавляет пользователя (словарь или User) в конец столбцов."""
+        for field in FIELDS:
+            value = user_data[field]
+            if field in INTERNED_FIELDS:
+                value = sys.intern(value)
+            self.columns[field].append(value)
+
+    def __len__(self):
+        return len(self.columns["login"])
+
+    def __getitem__(self, index):
+        """Собирает объект User для строки с номером 'index'."""
+        return User(*(self.columns[field][index] for field in FIELDS))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+def _sample_lines(count):
+    """Синтетические строки users.data (без кавычек) для замера памяти."""
+    cities = ["Москва", "Санкт-Петербург", "Казань", "Новосибирск", "Екатеринбург"]
+    genders = ["Мужской", "Женский"]
+    return [f"Фамилия{i};Имя{i % 500};Отчество{i % 300};{i % 28 + 1:02d}.01.19{i % 90 + 10};"
+            f"{genders[i % 2]};{cities[i % 5]};user{i}@mail.ru;user{i};pw{i}" for i in range(count)]
+
+
+def measure_bytes_per_user(count=100000):
+    """
+    Замеряет память (в байтах на пользователя) для трех представлений:
+    словарь (как в исходном load_users), User и UserColumns.
+    Учитывается все, что остается в памяти после разбора строк файла,
+    включая сами строки полей.
+    """
+    import tracemalloc
+
+    def measure(build):
+        lines = _sample_lines(count)
+        tracemalloc.start()
+        container = build(line.split(";") for line in lines)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del container
+        return size / count
+
+    return {
+        "dict": measure(lambda rows: [dict(zip(FIELDS, row)) for row in rows]),
+        "User": measure(lambda rows: [User.from_row(row) for row in rows]),
+        "UserColumns": measure(lambda rows: UserColumns(User.from_row(row) for row in rows)),
+    }
+
+
+if __name__ == "__main__":
+    results = measure_bytes_per_user()
+    for name, bytes_per_user in results.items():
+        print(f"{name:12s} {bytes_per_user:8.1f} байт на пользователя")
@@ -0,0 +1,253 @@
+"""
+Разбиение файла пользователей на сегменты (шарды) по хешу логина.
+
+Вместо одного users.data записи хранятся в N файлах users.data.000-of-008,
+users.data.001-of-008 и т.д. Сегмент пользователя определяется по CRC32
+логина (в отличие от hash() одинаков во всех процессах и запусках).
+Список сегментов хранится в небольшом манифесте users.data.manifest (JSON):
+если манифест есть, файл считается разбитым, и load_users читает сегменты.
+
+Сегменты загружаются параллельно (пул процессов на многоядерной машине и
+больших данных, иначе пул потоков) и объединяются в одно хранилище.
+Регистрация дописывает запись только в сегмент своего логина, а уплотнение
+переписывает только сегменты, которые изменились.
+
+    python user_shards.py split --count 8     - разбить users.data на 8 сегментов
+    python user_shards.py reshard --count 16  - перераспределить по 16 сегментам
+    python user_shards.py merge               - собрать обратно в один файл
+    python user_shards.py info                - показать сегменты и число записей
+"""
+import argparse
+import json
+import os
+import zlib
+
+from user_data import FILENAME, atomic_write, file_lock, iter_users, save_users
+from user_record import User
+
+# Разбор CSV в пуле процессов окупает запуск процессов только на больших сегментах
+PROCESS_LOAD_MIN_BYTES = 16 * 1024 * 1024
+MANIFEST_SUFFIX = ".manifest"
+MANIFEST_FORMAT = "kursach-users-shards"
+MANIFEST_VERSION = 1
+
+
+def manifest_path(filename):
+    """Путь к манифесту сегментов для файла пользователей."""
+    return filename + MANIFEST_SUFFIX
+
+
+def shard_index(login, count):
+    """Номер сегмента (0..count-1), которому принадлежит логин."""
+    return zlib.crc32(login.encode('utf-8')) % count
+
+
+def shard_filename(filename, index, count):
+    """Имя файла сегмента: users.data.003-of-008."""
+    return f"{filename}.{index:03d}-of-{count:03d}"
+
+
+def read_manifest(filename):
+    """
+    Читает манифест сегментов. Возвращает словарь {"count": N, "shards": [имена файлов]}
+    или None, если файл пользователей не разбит на сегменты.
+    """
+    try:
+        with open(manifest_path(filename), encoding='utf-8') as file:
+            manifest = json.load(file)
+    except FileNotFoundError:
+        return None
+    if manifest.get("format") != MANIFEST_FORMAT or len(manifest.get("shards", ())) != manifest.get("count"):
+        raise ValueError(f"Некорректный манифест сегментов '{manifest_path(filename)}'.")
+    return manifest
+
+
+def shard_files(filename, manifest=None):
+    """Полные пути к файлам сегментов (имена в манифесте - относительно его папки)."""
+    manifest = manifest if manifest is not None else read_manifest(filename)
+    directory = os.path.dirname(filename)
+    return [os.path.join(directory, name) for name in manifest["shards"]]
+
+
+def owning_shard(filename, login, manifest=None):
+    """Путь к сегменту, в который записывается пользователь с логином 'login'."""
+    manifest = manifest if manifest is not None else read_manifest(filename)
+    return shard_files(filename, manifest)[shard_index(login, manifest["count"])]
+
+
+def _write_manifest(filename, count):
+    """Атомарно записывает манифест для 'count' сегментов."""
+    shards = [os.path.basename(shard_filename(filename, index, count)) for index in range(count)]
+    manifest = {"format": MANIFEST_FORMAT, "version": MANIFEST_VERSION, "hash": "crc32", "count": count,
+                "shards": shards}
+    with atomic_write(manifest_path(filename), encoding='utf-8') as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=2)
+
+
+# --- Загрузка ---
+
+def _load_shard(path):
+    """Работа потока пула: читает один сегмент в список User."""
+    return list(iter_users(path))
+
+
+def _read_shard_rows(path):
+    """
+    Работа процесса пула: разбирает CSV одного сегмента (по тем же правилам, что и
+    iter_users) и возвращает строки-списки. Записи User собираются уже в основном
+    процессе (строки передаются дешевле объектов, а интернирование пола и города
+    должно происходить в нем).
+    """
+    return [user_data.to_row() for user_data in iter_users(path)]
+
+
+def _use_processes(paths):
+    """
+    Выбирает пул для загрузки: процессы - если ядер и сегментов больше одного и данных
+    достаточно, чтобы окупить запуск процессов; иначе потоки. Под GIL потоки не ускоряют
+    разбор CSV, зато почти ничего не стоят и совмещают чтение с диска.
+    """
+    if (os.cpu_count() or 1) < 2 or len(paths) < 2:
+        return False
+    total = sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+    return total >= PROCESS_LOAD_MIN_BYTES
+
+
+def load_sharded(filename=FILENAME, workers=None, processes=None, manifest=None):
+    """
+    Загружает всех пользователей из сегментов параллельно и объединяет их в один список
+    (в порядке сегментов, внутри сегмента - в порядке регистрации).
+
+    :param workers: Размер пула (по умолчанию - по числу сегментов, но не больше числа ядер).
+    :param processes: True - пул процессов (разбор CSV на нескольких ядрах),
+                      False - пул потоков (без затрат на запуск процессов),
+                      None - выбрать по числу ядер, сегментов и размеру данных (_use_processes).
+    """
+    paths = shard_files(filename, manifest)
+    if processes is None:
+        processes = _use_processes(paths)
+    workers = workers or max(1, min(len(paths), os.cpu_count() or 1))
+    users = []
+    # Пулы импортируются здесь: concurrent.futures (logging, а для процессов еще и multiprocessing)
+    # заметно замедляет запуск GUI, а нужен только при загрузке разбитого файла
+    if processes:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for rows in pool.map(_read_shard_rows, paths):
+                users.extend(User.from_row(row) for row in rows)
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for shard_users in pool.map(_load_shard, paths):
+                users.extend(shard_users)
+    return users
+
+
+def _load_any(filename, workers=None):
+    """Загружает пользователей из разбитого или обычного файла."""
+    manifest = read_manifest(filename)
+    if manifest is not None:
+        return load_sharded(filename, workers, manifest=manifest), shard_files(filename, manifest)
+    return list(iter_users(filename)), []
+
+
+# --- Запись и преобразования ---
+
+def save_shards(users, filename, paths, manifest=None):
+    """
+    Атомарно переписывает только указанные сегменты (уплотнение измененных сегментов).
+    'users' - все пользователи хранилища, 'paths' - пути сегментов из shard_files.
+    """
+    manifest = manifest if manifest is not None else read_manifest(filename)
+    all_paths = shard_files(filename, manifest)
+    groups = {all_paths.index(path): [] for path in paths}
+    for user_data in users:
+        group = groups.get(shard_index(user_data["login"], manifest["count"]))
+        if group is not None:
+            group.append(user_data)
+    for index, group in groups.items():
+        save_users(group, all_paths[index])
+
+
+def save_sharded(users, filename, count):
+    """Распределяет пользователей по 'count' сегментам и атомарно записывает каждый из них."""
+    groups = [[] for _ in range(count)]
+    for user_data in users:
+        groups[shard_index(user_data["login"], count)].append(user_data)
+    for index, group in enumerate(groups):
+        save_users(group, shard_filename(filename, index, count))
+
+
+def _remove(paths, keep=()):
+    for path in paths:
+        if path not in keep:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def reshard(filename=FILENAME, count=8, workers=None):
+    """
+    Перераспределяет пользователей по 'count' сегментам. Работает и для обычного
+    файла (разбиение), и для уже разбитого (смена числа сегментов).
+    Сначала записываются новые сегменты, затем атомарно заменяется манифест
+    и только после этого удаляются старые файлы - при сбое данные не теряются.
+    Возвращает число пользователей.
+    """
+    if count < 1:
+        raise ValueError("Количество сегментов должно быть не меньше 1.")
+    with file_lock(filename):
+        users, old_paths = _load_any(filename, workers)
+        save_sharded(users, filename, count)
+        _write_manifest(filename, count) # С этого момента действует новое разбиение
+        new_paths = [shard_filename(filename, index, count) for index in range(count)]
+        _remove(old_paths, keep=new_paths)
+        _remove([filename]) # Обычный файл больше не используется
+    return len(users)
+
+
+def merge_shards(filename=FILENAME, workers=None):
+    """
+    Собирает сегменты обратно в один файл 'filename' и удаляет манифест и сегменты.
+    Возвращает число пользователей.
+    """
+    with file_lock(filename):
+        manifest = read_manifest(filename)
+        if manifest is None:
+            raise ValueError(f"Файл '{filename}' не разбит на сегменты.")
+        paths = shard_files(filename, manifest)
+        users = load_sharded(filename, workers, manifest=manifest)
+        save_users(users, filename)
+        os.remove(manifest_path(filename)) # С этого момента снова действует обычный файл
+        _remove(paths)
+    return len(users)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Разбиение файла пользователей на сегменты.")
+    parser.add_argument('command', choices=['split', 'reshard', 'merge', 'info'], help="Действие")
+    parser.add_argument('--file', default=FILENAME, help="Файл пользователей")
+    parser.add_argument('--count', type=int, default=8, help="Количество сегментов (split, reshard)")
+    parser.add_argument('--workers', type=int, default=None, help="Потоков загрузки")
+    args = parser.parse_args(argv)
+
+    if args.command in ('split', 'reshard'):
+        if args.command == 'split' and read_manifest(args.file) is not None:
+            parser.error(f"Файл '{args.file}' уже разбит на сегменты, используйте reshard.")
+        count = reshard(args.file, args.count, args.workers)
+        print(f"{count} пользователей распределено по {args.count} сегментам.")
+    elif args.command == 'merge':
+        count = merge_shards(args.file, args.workers)
+        print(f"{count} пользователей собрано в файл '{args.file}'.")
+    else:
+        manifest = read_manifest(args.file)
+        if manifest is None:
+            print(f"Файл '{args.file}' не разбит на сегменты.")
+            return
+        for path in shard_files(args.file, manifest):
+            print(f"{path}: {sum(1 for _ in iter_users(path, fields=('login',)))} пользователей")
+
+
+if __name__ == "__main__":
+    main()
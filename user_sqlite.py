@@ -0,0 +1,204 @@
+"""
+Хранилище пользователей в базе SQLite (модуль sqlite3) - бэкенд user_backends.
+
+Журнал WAL, уникальный индекс по логину, индекс по email, пакетные транзакции.
+С этой базой AuthService ничего не загружает при запуске: вход и проверка
+дубликатов выполняются запросами по индексам.
+
+Запись идет через одно соединение (транзакции BEGIN IMMEDIATE под блокировкой потока),
+а чтение - через отдельные соединения, по одному на поток: в режиме WAL читатели
+не ждут писателя, поэтому вход не блокируется, пока идет транзакция регистрации.
+"""
+import contextlib
+import itertools
+import sqlite3
+import threading
+
+from user_backends import BATCH_SIZE, DuplicateUserError, StorageBackend
+from user_record import FIELDS, User, email_key
+
+SQLITE_FILENAME = "users.db"
+
+_COLUMNS = ", ".join(FIELDS)
+# Запросы - постоянные строки с параметрами: sqlite3 подготавливает каждый один раз
+# и берет из кэша подготовленных выражений соединения при следующих вызовах.
+_SCHEMA = (
+    f"CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, "
+    f"{', '.join(name + ' TEXT NOT NULL' for name in FIELDS)}, email_key TEXT NOT NULL)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS users_login ON users (login)",
+    "CREATE INDEX IF NOT EXISTS users_email ON users (email_key)",
+)
+_SELECT_BY_LOGIN = f"SELECT {_COLUMNS} FROM users WHERE login = ?"
+_SELECT_BY_EMAIL = f"SELECT {_COLUMNS} FROM users WHERE email_key = ? ORDER BY id LIMIT 1"
+_SELECT_AFTER = f"SELECT id, {_COLUMNS} FROM users WHERE id > ? ORDER BY id" # Записи после заданной
+_EXISTS = "SELECT 1 FROM users WHERE login = ?"
+_COUNT = "SELECT count(*) FROM users"
+_LAST_ID = "SELECT coalesce(max(id), 0) FROM users"
+_INSERT = f"INSERT INTO users ({_COLUMNS}, email_key) VALUES ({', '.join('?' * (len(FIELDS) + 1))})"
+_INSERT_OR_IGNORE = _INSERT.replace("INSERT", "INSERT OR IGNORE", 1)
+
+
+def _to_params(user_data):
+    return [user_data[name] for name in FIELDS] + [email_key(user_data["email"])]
+
+
+class SqliteBackend(StorageBackend):
+    """
+    Пользователи в базе SQLite.
+
+    :param filename: Файл базы (создается при первом открытии).
+    :param batch_size: Записей в одной транзакции insert_many.
+    """
+
+    lazy = True # Пользователи остаются в базе - UserStore ищет в ней (store.base)
+
+    def __init__(self, filename=SQLITE_FILENAME, batch_size=BATCH_SIZE):
+        self.filename = filename
+        self.batch_size = batch_size
+        # isolation_level=None - транзакции открываются явно (BEGIN IMMEDIATE);
+        # соединение записи используется из нескольких потоков (GUI, сервер), доступ - под self._lock
+        self.connection = self._connect()
+        self._lock = threading.RLock()
+        self.connection.execute("PRAGMA journal_mode=WAL") # Читатели не блокируют писателя и наоборот
+        for statement in _SCHEMA:
+            self.connection.execute(statement)
+        self._local = threading.local() # Соединение чтения текущего потока
+        self._readers = [] # Все соединения чтения - чтобы закрыть их в close()
+        self._readers_lock = threading.Lock() # Не self._lock: его держит открытая транзакция записи
+        self._checkpoint_pending = False # Перенос WAL, отложенный до конца транзакции
+        self._last_id = self.connection.execute(_LAST_ID).fetchone()[0] # Граница для changes()
+
+    def _connect(self):
+        # check_same_thread=False: соединения закрываются в close() из любого потока
+        connection = sqlite3.connect(self.filename, isolation_level=None, check_same_thread=False, timeout=30.0)
+        connection.execute("PRAGMA synchronous=FULL") # Как и у CSV: каждая фиксация сбрасывается на диск
+        return connection
+
+    def _reader(self):
+        """Соединение чтения текущего потока (создается при первом обращении)."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+            with self._readers_lock:
+                self._readers.append(connection)
+        return connection
+
+    def _fetch_one(self, query, parameters):
+        row = self._reader().execute(query, parameters).fetchone()
+        return None if row is None else User.from_row(row)
+
+    def find_by_login(self, login):
+        return self._fetch_one(_SELECT_BY_LOGIN, (login,))
+
+    def find_by_email(self, email):
+        return self._fetch_one(_SELECT_BY_EMAIL, (email_key(email),))
+
+    def __contains__(self, login):
+        return self._reader().execute(_EXISTS, (login,)).fetchone() is not None
+
+    def __len__(self):
+        return self._reader().execute(_COUNT).fetchone()[0]
+
+    def _iter_after(self, last_id):
+        """Перебирает пары (id, пользователь) после 'last_id' порциями, не держа весь результат в памяти."""
+        cursor = self._reader().execute(_SELECT_AFTER, (last_id,))
+        while True:
+            rows = cursor.fetchmany(self.batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row[0], User.from_row(row[1:])
+
+    def __iter__(self):
+        for _, user_data in self._iter_after(0):
+            yield user_data
+
+    def load(self):
+        users = []
+        last_id = 0
+        for last_id, user_data in self._iter_after(0):
+            users.append(user_data)
+        self._last_id = last_id
+        return users
+
+    def changes(self):
+        """Записи, добавленные после прошлого load() или changes() (в том числе этим процессом)."""
+        users = []
+        for self._last_id, user_data in self._iter_after(self._last_id):
+            users.append(user_data)
+        return users, False # База не заменяется целиком - новые записи видны по id
+
+    @contextlib.contextmanager
+    def transaction(self, exclusive=True):
+        """
+        Транзакция записи. BEGIN IMMEDIATE сразу берет блокировку записи базы,
+        поэтому проверка дубликатов и вставка не пересекаются с другими процессами.
+        Вложенный вызов выполняется внутри уже открытой транзакции.
+        exclusive=False ничего не блокирует: в режиме WAL чтение видит зафиксированные записи.
+        """
+        if not exclusive:
+            yield
+            return
+        with self._lock:
+            if self.connection.in_transaction:
+                yield
+                return
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+            if self._checkpoint_pending:
+                self._checkpoint()
+
+    def append(self, user_data):
+        try:
+            with self.transaction():
+                self.connection.execute(_INSERT, _to_params(user_data))
+        except sqlite3.IntegrityError:
+            raise DuplicateUserError(f"Пользователь с логином '{user_data['login']}' уже существует.") from None
+
+    insert = append # Уникальность логина проверяет сам индекс базы
+
+    def insert_many(self, users):
+        """
+        Пакетная вставка: по 'batch_size' записей в одной транзакции (executemany).
+        Пользователи с уже существующим логином пропускаются. Возвращает число добавленных.
+        """
+        inserted = 0
+        users = iter(users)
+        while True:
+            batch = [_to_params(user_data) for user_data in itertools.islice(users, self.batch_size)]
+            if not batch:
+                break
+            with self.transaction():
+                before = self.connection.total_changes
+                self.connection.executemany(_INSERT_OR_IGNORE, batch)
+                inserted += self.connection.total_changes - before
+        return inserted
+
+    def compact(self, users=None, everything=False):
+        """
+        Переносит журнал WAL в основной файл базы и усекает журнал ('users' не нужен:
+        база не переписывается из памяти). Внутри транзакции перенос невозможен,
+        поэтому он откладывается до ее фиксации.
+        """
+        with self._lock:
+            if self.connection.in_transaction:
+                self._checkpoint_pending = True
+            else:
+                self._checkpoint()
+
+    def _checkpoint(self):
+        self._checkpoint_pending = False
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        with self._readers_lock:
+            for connection in self._readers:
+                connection.close()
+            self._readers = []
+        with self._lock:
+            self.connection.close()
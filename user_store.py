@@ -0,0 +1,122 @@
+from user_record import email_key # Единое правило сравнения email
+
+
+class UserStore:
+    """
+    Хранилище пользователей в памяти с хеш-индексами.
+
+    Хранит обычный список словарей пользователей (self.users), как и раньше,
+    а дополнительно поддерживает два словаря-индекса:
+      - по логину (логин -> запись пользователя);
+      - по email (email в нижнем регистре -> запись пользователя).
+    Благодаря индексам поиск по логину и проверка дубликатов выполняются за O(1),
+    а не проходом по всему списку.
+
+    Дополнительно можно подключить базовый источник только для чтения
+    (например, BinaryUserFile из users_binary.py): если пользователь
+    не найден в памяти, поиск продолжается в нем.
+
+    Другие индексы (например, UserQueryIndex из user_query.py) могут подписаться
+    на изменения через subscribe и обновляться вместе с хранилищем; при полной
+    замене они получают и пользователей базового источника.
+    """
+
+    def __init__(self, users=None, base=None):
+        self.users = []          # Список всех пользователей (порядок как в файле)
+        self._by_login = {}      # Индекс: логин -> словарь пользователя
+        self._by_email = {}      # Индекс: email -> словарь пользователя
+        self.base = base         # Базовый источник для поиска (или None)
+        self._listeners = []     # Подписчики на изменения (методы on_append и on_reload)
+        if users:
+            self.reload(users)
+
+    def _index(self, user_data):
+        """Добавляет запись пользователя в индексы."""
+        self._by_login[user_data["login"]] = user_data
+        key = email_key(user_data.get("email"))
+        if key:
+            # setdefault: при дубликатах в старом файле индекс указывает на первую запись
+            self._by_email.setdefault(key, user_data)
+
+    def reload(self, users):
+        """
+        Заменяет содержимое хранилища списком 'users' (например, результатом load_users)
+        и полностью перестраивает индексы.
+        Список изменяется на месте, чтобы внешние ссылки на self.users оставались верными.
+        Новые индексы строятся отдельно и подменяют старые целиком, поэтому поиск
+        из другого потока видит либо старые, либо новые индексы, но не пустые.
+        """
+        by_login = {}
+        by_email = {}
+        for user_data in users:
+            # Если в файле встречаются одинаковые логины, побеждает первая запись,
+            # как и при линейном поиске find_user_by_login.
+            if user_data["login"] not in by_login:
+                by_login[user_data["login"]] = user_data
+                key = email_key(user_data.get("email"))
+                if key:
+                    by_email.setdefault(key, user_data)
+        self._by_login, self._by_email = by_login, by_email
+        self.users[:] = users
+        if self._listeners:
+            all_users = self.all_users()
+            for listener in self._listeners:
+                listener.on_reload(all_users)
+
+    def append(self, user_data):
+        """Добавляет нового пользователя в список и в индексы."""
+        self.users.append(user_data)
+        if user_data["login"] not in self._by_login:
+            self._index(user_data)
+        for listener in self._listeners:
+            listener.on_append(user_data)
+
+    def subscribe(self, listener):
+        """
+        Подписывает 'listener' на изменения хранилища: при добавлении вызывается
+        listener.on_append(user), при полной замене - listener.on_reload(users).
+        Сразу после подписки вызывается on_reload с текущим содержимым (см. all_users).
+        """
+        self._listeners.append(listener)
+        listener.on_reload(self.all_users())
+
+    def all_users(self):
+        """
+        Пользователи базового источника и затем пользователи из памяти, которых в нем нет
+        (при совпадении логина побеждает запись базового источника). Без базового
+        источника - сам список self.users.
+        """
+        if self.base is None:
+            return self.users
+        users = list(self.base)
+        users.extend(user_data for user_data in self.users if user_data["login"] not in self.base)
+        return users
+
+    def total(self):
+        """Число пользователей вместе с базовым источником (общие логины считаются один раз)."""
+        if self.base is None:
+            return len(self.users)
+        return len(self.base) + sum(1 for user_data in self.users if user_data["login"] not in self.base)
+
+    def find_by_login(self, login):
+        """Возвращает словарь пользователя по логину или None."""
+        user_data = self._by_login.get(login)
+        if user_data is None and self.base is not None:
+            user_data = self.base.find_by_login(login)
+        return user_data
+
+    def find_by_email(self, email):
+        """Возвращает словарь пользователя по email (без учета регистра) или None."""
+        user_data = self._by_email.get(email_key(email))
+        if user_data is None and self.base is not None:
+            user_data = self.base.find_by_email(email)
+        return user_data
+
+    def __contains__(self, login):
+        return login in self._by_login or (self.base is not None and login in self.base)
+
+    def __len__(self):
+        return len(self.users)
+
+    def __iter__(self):
+        return iter(self.users)
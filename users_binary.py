@@ -0,0 +1,282 @@
+"""
+Двоичный формат хранения пользователей с ленивой загрузкой через mmap.
+
+Структура файла (все числа little-endian):
+  1. Заголовок: сигнатура, версия, число записей и смещения остальных блоков.
+  2. Таблица логинов: для каждой записи (смещение ключа, длина ключа,
+     смещение записи, длина записи), отсортирована по логину.
+  3. Таблица email: то же самое, но ключом служит email в нижнем регистре
+     (нужна для проверки дубликатов при регистрации).
+  4. Блок ключей: байты логинов и email подряд.
+  5. Блок записей: каждая запись - 9 длин полей и затем сами поля в UTF-8.
+
+При открытии файл только отображается в память (mmap), а запись пользователя
+разбирается в объект User лишь тогда, когда ее ищут по логину или email.
+
+Снимок лежит рядом с файлом пользователей (users.data -> users.bin, см.
+snapshot_path), и хранилище CSV (user_backends.CsvBackend) подключает его
+всегда, когда он есть: поиск, перебор, проверка дубликатов, поиск по условиям,
+пакетный импорт и экспорт видят записи снимка и users.data вместе.
+to-binary переносит записи CSV (в том числе разбитого на сегменты) в снимок;
+с --reset-journal users.data после этого очищается и дальше служит журналом
+регистраций, сделанных после снимка, - при запуске разбирается только он.
+to-csv собирает снимок и журнал обратно в CSV-файл и удаляет снимок.
+"""
+import argparse
+import mmap
+import os
+import struct
+
+from user_data import atomic_write, file_lock, load_users, save_users # Журнал users.data и его блокировка
+from user_record import FIELDS, User, email_key # Порядок полей, компактная запись и правило сравнения email
+from user_shards import read_manifest, save_sharded # Файл пользователей может быть разбит на сегменты
+
+MAGIC = b"KUSR"   # Сигнатура файла
+VERSION = 1       # Версия формата
+
+_HEADER = struct.Struct("<4sHHIQQQQ") # magic, version, резерв, count, смещения: логины, email, ключи, записи
+_ENTRY = struct.Struct("<QIQI")       # смещение ключа, длина ключа, смещение записи, длина записи
+_LENGTHS = struct.Struct("<9I")       # длины 9 полей записи
+
+# Поле пароля после XOR может содержать суррогатные коды, поэтому 'surrogatepass'
+_ERRORS = "surrogatepass"
+
+
+def snapshot_path(filename):
+    """Путь двоичного снимка для файла пользователей: users.data -> users.bin."""
+    return os.path.splitext(filename)[0] + ".bin"
+
+
+def _save_journal(users, csv_filename):
+    """Атомарно записывает CSV-файл пользователей; разбитый файл - по его сегментам."""
+    manifest = read_manifest(csv_filename)
+    if manifest is None:
+        save_users(users, csv_filename)
+    else:
+        save_sharded(users, csv_filename, manifest["count"])
+
+
+def _encode_record(user_data):
+    """Упаковывает словарь пользователя в байты записи."""
+    parts = [user_data[field].encode("utf-8", _ERRORS) for field in FIELDS]
+    return _LENGTHS.pack(*(len(part) for part in parts)) + b"".join(parts)
+
+
+def _decode_record(buffer, offset):
+    """Разбирает запись, начинающуюся с позиции 'offset', в объект User."""
+    lengths = _LENGTHS.unpack_from(buffer, offset)
+    position = offset + _LENGTHS.size
+    values = []
+    for length in lengths:
+        values.append(bytes(buffer[position:position + length]).decode("utf-8", _ERRORS))
+        position += length
+    return User(*values)
+
+
+def write_binary(users, filename):
+    """
+    Записывает список пользователей в двоичный файл.
+    При повторяющихся логинах сохраняется первая запись (как при поиске в списке).
+    Файл заменяется атомарно (atomic_write), поэтому процесс, который уже
+    отобразил старый снимок в память, продолжает читать его без ошибок.
+    """
+    records = []       # Байты записей в исходном порядке
+    login_keys = {}    # логин (байты) -> номер записи
+    email_keys = {}    # email (байты) -> номер записи
+    for user_data in users:
+        login = user_data["login"].encode("utf-8", _ERRORS)
+        if login in login_keys:
+            continue
+        login_keys[login] = len(records)
+        email = email_key(user_data.get("email")).encode("utf-8", _ERRORS)
+        if email and email not in email_keys:
+            email_keys[email] = len(records)
+        records.append(_encode_record(user_data))
+
+    count = len(records)
+    login_table_offset = _HEADER.size
+    email_table_offset = login_table_offset + count * _ENTRY.size
+    keys_offset = email_table_offset + len(email_keys) * _ENTRY.size
+    keys_size = sum(len(key) for key in login_keys) + sum(len(key) for key in email_keys)
+    records_offset = keys_offset + keys_size
+
+    # Смещения записей внутри файла
+    record_offsets = []
+    position = records_offset
+    for record in records:
+        record_offsets.append(position)
+        position += len(record)
+
+    with atomic_write(filename, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, 0, count, login_table_offset,
+                                email_table_offset, keys_offset, records_offset))
+        key_position = keys_offset
+        key_blocks = []
+        # Таблицы сортируются по байтам ключа: порядок UTF-8 совпадает с порядком кодов символов
+        for table in (login_keys, email_keys):
+            for key in sorted(table):
+                index = table[key]
+                file.write(_ENTRY.pack(key_position, len(key), record_offsets[index], len(records[index])))
+                key_blocks.append(key)
+                key_position += len(key)
+        file.write(b"".join(key_blocks))
+        for record in records:
+            file.write(record)
+
+
+class BinaryUserFile:
+    """
+    Пользователи из двоичного файла, доступные без полной загрузки.
+    Поиск выполняется двоичным поиском по отсортированным таблицам ключей.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self._count, self._login_table, self._email_table,
+         self._keys_offset, self._records_offset) = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"Файл '{filename}' не является двоичным файлом пользователей.")
+        self._email_count = (self._keys_offset - self._email_table) // _ENTRY.size
+
+    def reopened(self):
+        """
+        Если снимок на диске заменен новым (to-binary), возвращает новый BinaryUserFile,
+        иначе - self. Старое отображение не закрывается сразу: его еще могут читать
+        другие потоки, оно освободится вместе с объектом.
+        """
+        try:
+            if os.path.samestat(os.stat(self.filename), os.fstat(self._file.fileno())):
+                return self
+        except FileNotFoundError:
+            return self # Снимок удален (to-csv) - его записи уже в CSV, но старое отображение еще верно
+        return BinaryUserFile(self.filename)
+
+    def close(self):
+        """Закрывает отображение и файл."""
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def _key(self, table, index):
+        """Возвращает байты ключа и описание записи для позиции 'index' таблицы."""
+        key_offset, key_len, record_offset, record_len = _ENTRY.unpack_from(self._map, table + index * _ENTRY.size)
+        return self._map[key_offset:key_offset + key_len], record_offset
+
+    def _search(self, table, count, key):
+        """Двоичный поиск ключа в таблице. Возвращает смещение записи или None."""
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            middle_key, record_offset = self._key(table, middle)
+            if middle_key < key:
+                low = middle + 1
+            elif middle_key > key:
+                high = middle
+            else:
+                return record_offset
+        return None
+
+    def find_by_login(self, login):
+        """Возвращает словарь пользователя по логину или None."""
+        record_offset = self._search(self._login_table, self._count, login.encode("utf-8", _ERRORS))
+        return None if record_offset is None else _decode_record(self._map, record_offset)
+
+    def find_by_email(self, email):
+        """Возвращает словарь пользователя по email (без учета регистра) или None."""
+        key = email_key(email).encode("utf-8", _ERRORS)
+        record_offset = self._search(self._email_table, self._email_count, key)
+        return None if record_offset is None else _decode_record(self._map, record_offset)
+
+    def __contains__(self, login):
+        return self._search(self._login_table, self._count, login.encode("utf-8", _ERRORS)) is not None
+
+    def logins(self):
+        """Перебирает логины в отсортированном порядке, не разбирая записи."""
+        for index in range(self._count):
+            key, _ = self._key(self._login_table, index)
+            yield key.decode("utf-8", _ERRORS)
+
+    def __iter__(self):
+        """Перебирает пользователей в порядке записи в файле, разбирая их по одному."""
+        position = self._records_offset
+        for _ in range(self._count):
+            lengths = _LENGTHS.unpack_from(self._map, position)
+            yield _decode_record(self._map, position)
+            position += _LENGTHS.size + sum(lengths)
+
+
+def csv_to_binary(csv_filename, binary_filename, reset_journal=False):
+    """
+    Переносит пользователей из CSV-файла (или из его сегментов) в двоичный снимок.
+    Записи добавляются к уже существующему снимку (при совпадении логина остается
+    запись снимка). Возвращает число записей снимка.
+
+    reset_journal=False: CSV-файл не меняется - его записи остаются и в снимке, и в журнале.
+    reset_journal=True: после записи снимка CSV-файл очищается - в нем будут накапливаться
+    только новые регистрации. Сначала атомарно записывается снимок, затем журнал: при сбое
+    между ними записи окажутся в обоих файлах, но не потеряются.
+    """
+    with file_lock(csv_filename):
+        users = []
+        if os.path.exists(binary_filename):
+            with BinaryUserFile(binary_filename) as snapshot:
+                users.extend(snapshot)
+        users.extend(load_users(csv_filename)) # load_users читает и разбитый на сегменты файл
+        write_binary(users, binary_filename)
+        if reset_journal:
+            _save_journal([], csv_filename)
+    with BinaryUserFile(binary_filename) as binary_file:
+        return len(binary_file)
+
+
+def binary_to_csv(binary_filename, csv_filename):
+    """
+    Собирает снимок и журнал обратно в CSV-файл users.data (разбитый файл - в его
+    сегменты): сначала записи снимка, затем регистрации из журнала, которых нет
+    в снимке. После этого снимок удаляется, чтобы его записи не читались дважды.
+    Возвращает число записей.
+    """
+    with file_lock(csv_filename):
+        with BinaryUserFile(binary_filename) as binary_file:
+            users = list(binary_file)
+            users.extend(user_data for user_data in load_users(csv_filename) if user_data["login"] not in binary_file)
+        _save_journal(users, csv_filename)
+        os.remove(binary_filename)
+    return len(users)
+
+
+def main(argv=None):
+    """
+    Конвертер между форматами:
+        python users_binary.py to-binary users.data users.bin   - снимок, users.data не меняется
+        python users_binary.py to-binary users.data users.bin --reset-journal   - и очистить users.data
+        python users_binary.py to-csv users.bin users.data      - снимок и журнал снова в CSV
+    Программа подключает снимок по имени файла пользователей (snapshot_path).
+    """
+    parser = argparse.ArgumentParser(description="Конвертация users.data между CSV и двоичным форматом.")
+    parser.add_argument('direction', choices=['to-binary', 'to-csv'], help="Направление конвертации")
+    parser.add_argument('source', help="Исходный файл")
+    parser.add_argument('target', help="Файл результата")
+    parser.add_argument('--reset-journal', action='store_true',
+                        help="to-binary: очистить CSV-файл после переноса записей в снимок")
+    args = parser.parse_args(argv)
+    if args.direction == 'to-binary':
+        count = csv_to_binary(args.source, args.target, reset_journal=args.reset_journal)
+    else:
+        count = binary_to_csv(args.source, args.target)
+    print(f"Сконвертировано {count} пользователей: '{args.source}' -> '{args.target}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,20 @@
+import argparse
 import base64
+import sys
 
+from xor_engine import xor_bytes # XOR всего буфера за один проход
+from metrics import timed # Необязательный замер времени (включается переменной KURSACH_METRICS)
+
+# Размер блока чтения при потоковой обработке. Кратен 3 и 4,
+# чтобы блоки Base64 всегда выравнивались без остатка.
+STREAM_CHUNK_SIZE = 3 * 4 * 16384
+
+# Таблица для удаления из входа всех символов, не входящих в алфавит Base64
+# (b64decode по умолчанию поступает так же - например, с переводами строк).
+_BASE64_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+_BASE64_JUNK = bytes(b for b in range(256) if b not in _BASE64_ALPHABET)
+
+@timed("xor_base64_cipher")
 def xor_base64_cipher(text_to_process, key, action='encode'):
     """
     Шифрует или дешифрует текст, используя XOR, а затем Base64.
@@ -13,17 +28,13 @@ def xor_base64_cipher(text_to_process, key, action='encode'):
     """
     # Преобразуем ключ в байты один раз
     key_bytes = key.encode('utf-8')
-    key_len = len(key_bytes)
 
     if action == 'encode':
         # 1. Преобразовать исходный текст в байты
         text_bytes = text_to_process.encode('utf-8')
 
-        # 2. Применить XOR. Создаем список байтов результата XOR
-        xor_result_bytes_list = []
-        for i, b in enumerate(text_bytes):
-            xor_result_bytes_list.append(b ^ key_bytes[i % key_len])
-        xor_result_bytes = bytes(xor_result_bytes_list) # Преобразуем список в байтовую строку
+        # 2. Применить XOR ко всему буферу сразу
+        xor_result_bytes = xor_bytes(text_bytes, key_bytes)
 
         # 3. Закодировать результат XOR в Base64
         base64_encoded_bytes = base64.b64encode(xor_result_bytes)
@@ -40,11 +51,7 @@ def xor_base64_cipher(text_to_process, key, action='encode'):
         xor_result_bytes_after_b64decode = base64.b64decode(base64_to_decode_bytes)
 
         # 3. Применить XOR еще раз к результату (байты)
-        # Создаем список байтов результата XOR
-        original_bytes_list = []
-        for i, b in enumerate(xor_result_bytes_after_b64decode):
-            original_bytes_list.append(b ^ key_bytes[i % key_len])
-        original_bytes_after_xor = bytes(original_bytes_list) # Преобразуем список в байтовую строку
+        original_bytes_after_xor = xor_bytes(xor_result_bytes_after_b64decode, key_bytes)
 
         # 4. Преобразовать исходные байты обратно в строку
         # Если байты не являются корректной UTF-8 последовательностью, здесь будет ошибка.
@@ -53,7 +60,82 @@ def xor_base64_cipher(text_to_process, key, action='encode'):
         print(f"Ошибка: Некорректное действие '{action}'. Используйте 'encode' или 'decode'.")
         return None 
 
-if __name__ == "__main__":
+def xor_base64_stream(source, destination, key, action='encode', chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Потоковый вариант xor_base64_cipher для файлов любого размера.
+    Данные читаются блоками фиксированного размера и сразу пишутся в выход,
+    поэтому расход памяти не зависит от размера файла.
+    Результат байт в байт совпадает с результатом xor_base64_cipher
+    для всего содержимого (в кодировке UTF-8).
+
+    :param source: Двоичный файловый объект для чтения.
+    :param destination: Двоичный файловый объект для записи.
+    :param key: Ключ для операции XOR (строка).
+    :param action: 'encode' для шифрования, 'decode' для дешифрования.
+    :param chunk_size: Примерный размер блока чтения в байтах.
+    :return: Количество байт, прошедших через XOR.
+    """
+    key_bytes = key.encode('utf-8')
+    processed = 0 # Сколько байт уже прошло через XOR - определяет фазу ключа
+
+    if action == 'encode':
+        block = max(3, chunk_size - chunk_size % 3) # Base64 кодирует группы по 3 байта
+        tail = b"" # Остаток, не кратный 3, переносится в следующий блок
+        while True:
+            chunk = source.read(block)
+            if not chunk:
+                break
+            data = xor_bytes(chunk, key_bytes, processed)
+            processed += len(data)
+            data = tail + data
+            cut = len(data) - len(data) % 3
+            destination.write(base64.b64encode(data[:cut]))
+            tail = data[cut:]
+        # Последняя неполная группа кодируется с дополнением '='
+        destination.write(base64.b64encode(tail))
+
+    elif action == 'decode':
+        block = max(4, chunk_size - chunk_size % 4) # Base64 декодирует группы по 4 символа
+        tail = b""
+        while True:
+            chunk = source.read(block)
+            if not chunk:
+                break
+            data = tail + chunk.translate(None, _BASE64_JUNK)
+            cut = len(data) - len(data) % 4
+            decoded = base64.b64decode(data[:cut])
+            destination.write(xor_bytes(decoded, key_bytes, processed))
+            processed += len(decoded)
+            tail = data[cut:]
+        if tail:
+            # Неполная группа в конце - та же ошибка, что и у b64decode
+            decoded = base64.b64decode(tail)
+            destination.write(xor_bytes(decoded, key_bytes, processed))
+            processed += len(decoded)
+    else:
+        raise ValueError(f"Некорректное действие '{action}'. Используйте 'encode' или 'decode'.")
+
+    return processed
+
+
+def xor_base64_file(input_path, output_path, key, action='encode', chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Шифрует или дешифрует файл 'input_path' в 'output_path' потоково.
+    Путь '-' означает стандартный ввод/вывод.
+    """
+    source = sys.stdin.buffer if input_path == '-' else open(input_path, 'rb')
+    destination = sys.stdout.buffer if output_path == '-' else open(output_path, 'wb')
+    try:
+        return xor_base64_stream(source, destination, key, action, chunk_size)
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        if destination is not sys.stdout.buffer:
+            destination.close()
+
+
+def self_check():
+    """Демонстрация: шифрует и дешифрует короткую строку и сверяет результат."""
     my_secret_text = "ghfhjkm123"
     my_key = "SimpleKey"
 
@@ -79,3 +161,25 @@ if __name__ == "__main__":
     else:
         print("Ошибка при шифровании.")
 
+
+def main(argv=None):
+    """
+    Точка входа командной строки.
+    Без аргументов выполняет демонстрацию, иначе - потоковую обработку файла:
+        python xor_cipher.py encode входной_файл выходной_файл --key КЛЮЧ
+    """
+    parser = argparse.ArgumentParser(description="XOR + Base64 шифрование файлов (потоково).")
+    parser.add_argument('action', choices=['encode', 'decode'], help="Действие")
+    parser.add_argument('input', help="Входной файл ('-' - стандартный ввод)")
+    parser.add_argument('output', help="Выходной файл ('-' - стандартный вывод)")
+    parser.add_argument('--key', default="SimpleKey", help="Ключ для XOR")
+    parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK_SIZE, help="Размер блока чтения в байтах")
+    args = parser.parse_args(argv)
+    xor_base64_file(args.input, args.output, args.key, args.action, args.chunk_size)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main()
+    else:
+        self_check()
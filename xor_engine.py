@@ -0,0 +1,122 @@
+"""
+Быстрый XOR целыми буферами.
+
+Вместо цикла по отдельным символам/байтам весь буфер обрабатывается за один проход:
+  - если установлен NumPy, XOR выполняется векторно над массивами uint8;
+  - иначе буфер и ключевой поток превращаются в одно большое целое число
+    (int.from_bytes), и XOR выполняется машинными словами внутри интерпретатора.
+Результат полностью совпадает с посимвольными функциями xor_cipher (kursach_02.py)
+и xor_base64_cipher (xor_cipher.py).
+"""
+import base64
+
+try:
+    import numpy # Необязательная зависимость: ускоряет XOR больших буферов
+except ImportError:
+    numpy = None
+
+
+def _key_stream(key_bytes, length, offset=0):
+    """
+    Возвращает ключ, циклически повторенный до длины 'length'.
+    'offset' - с какой позиции ключа начинать (фаза ключа),
+    нужна при обработке данных по частям.
+    """
+    key_len = len(key_bytes)
+    if key_len == 0:
+        raise ValueError("Ключ для XOR не может быть пустым.")
+    offset %= key_len
+    repeats = (offset + length) // key_len + 1
+    return (key_bytes * repeats)[offset:offset + length]
+
+
+def xor_bytes(data, key_bytes, offset=0):
+    """
+    Применяет XOR с циклическим ключом к буферу целиком.
+
+    :param data: bytes, bytearray или memoryview.
+    :param key_bytes: Ключ в виде байтов.
+    :param offset: Фаза ключа для первого байта буфера.
+    :return: Результат в виде bytes.
+    """
+    data = memoryview(data).cast('B') # Единое представление для любого буфера
+    length = len(data)
+    if length == 0:
+        return b""
+    stream = _key_stream(bytes(key_bytes), length, offset)
+    if numpy is not None:
+        result = numpy.frombuffer(data, dtype=numpy.uint8) ^ numpy.frombuffer(stream, dtype=numpy.uint8)
+        return result.tobytes()
+    # Чистый Python: один XOR двух длинных целых чисел вместо цикла по байтам
+    value = int.from_bytes(data, 'little') ^ int.from_bytes(stream, 'little')
+    return value.to_bytes(length, 'little')
+
+
+def xor_text(text, key):
+    """
+    XOR строки по кодам Unicode-символов - то же, что xor_cipher из kursach_02.py.
+    Строка переводится в UTF-32 (4 байта на символ), и XOR выполняется над байтами.
+    'surrogatepass' нужен, так как результат XOR может попасть в диапазон суррогатов.
+    """
+    if not text:
+        return ""
+    data = text.encode('utf-32-le', 'surrogatepass')
+    key_bytes = key.encode('utf-32-le', 'surrogatepass')
+    return _decode_utf32(xor_bytes(data, key_bytes))
+
+
+def _decode_utf32(data):
+    """Декодирует UTF-32, сообщая о недопустимом коде так же, как chr()."""
+    try:
+        return data.decode('utf-32-le', 'surrogatepass')
+    except UnicodeDecodeError:
+        # Код символа после XOR вышел за пределы Unicode - chr() бросил бы ValueError
+        raise ValueError("Результат XOR выходит за пределы допустимых кодов Unicode.") from None
+
+
+def _xor_batch(chunks, key_bytes):
+    """
+    XOR для списка буферов за один вызов.
+    Буферы склеиваются, ключевой поток для каждого начинается с нулевой фазы,
+    после чего результат снова разрезается по исходным длинам.
+    """
+    lengths = [len(chunk) for chunk in chunks]
+    longest = max(lengths, default=0)
+    if longest == 0:
+        return [b"" for _ in chunks]
+    base_stream = _key_stream(key_bytes, longest)
+    stream = b"".join(base_stream[:length] for length in lengths)
+    joined = b"".join(chunks)
+    if numpy is not None:
+        mixed = (numpy.frombuffer(joined, dtype=numpy.uint8) ^ numpy.frombuffer(stream, dtype=numpy.uint8)).tobytes()
+    else:
+        mixed = (int.from_bytes(joined, 'little') ^ int.from_bytes(stream, 'little')).to_bytes(len(joined), 'little')
+    result = []
+    position = 0
+    for length in lengths:
+        result.append(mixed[position:position + length])
+        position += length
+    return result
+
+
+def xor_text_batch(texts, key):
+    """Применяет xor_text к каждой строке списка за один проход."""
+    key_bytes = key.encode('utf-32-le', 'surrogatepass')
+    chunks = [text.encode('utf-32-le', 'surrogatepass') for text in texts]
+    return [_decode_utf32(chunk) for chunk in _xor_batch(chunks, key_bytes)]
+
+
+def xor_base64_batch(texts, key, action='encode'):
+    """
+    Пакетный аналог xor_base64_cipher: шифрует ('encode') или дешифрует ('decode')
+    список строк за один вызов.
+    """
+    key_bytes = key.encode('utf-8')
+    if action == 'encode':
+        chunks = [text.encode('utf-8') for text in texts]
+        return [base64.b64encode(chunk).decode('utf-8') for chunk in _xor_batch(chunks, key_bytes)]
+    elif action == 'decode':
+        chunks = [base64.b64decode(text.encode('utf-8')) for text in texts]
+        return [chunk.decode('utf-8') for chunk in _xor_batch(chunks, key_bytes)]
+    else:
+        raise ValueError(f"Некорректное действие '{action}'. Используйте 'encode' или 'decode'.")